@@ -0,0 +1,156 @@
+from sqlalchemy import update, case, or_
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, UTC
+from dotenv import load_dotenv
+from database import async_session
+from models import User
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+ACTIVITY_TRACKING_ENABLED = os.getenv('ACTIVITY_TRACKING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+ACTIVITY_FLUSH_SECONDS = float(os.getenv('ACTIVITY_FLUSH_SECONDS', 30))
+
+ACTIVITY_BUFFER_MAX_USERS = int(os.getenv('ACTIVITY_BUFFER_MAX_USERS', 10000))
+
+ACTIVITY_FLUSH_CHUNK = 500
+
+
+class ActivityBuffer:
+
+    # Write-behind last_seen_at: requests only touch a dict, and each flush writes one UPDATE per ACTIVITY_FLUSH_CHUNK
+    # users seen since the last one, so the cost follows active users per interval instead of requests
+
+    def __init__(self, interval: float, max_users: int):
+
+        self.interval = interval
+
+        self.max_users = max_users
+
+        self._pending = {}
+
+        self._task = None
+
+        self._flush_task = None
+
+        self.flushed = 0
+
+        self.dropped = 0
+
+    def record(self, user_id):
+
+        now = datetime.now(UTC).replace(tzinfo=None)
+
+        if user_id in self._pending or len(self._pending) < self.max_users:
+
+            self._pending[user_id] = now
+
+            if len(self._pending) >= self.max_users:
+
+                self._flush_soon()
+
+            return
+
+        # Full while a flush is still writing: last-seen is best effort, so drop rather than grow
+
+        self.dropped += 1
+
+        self._flush_soon()
+
+    def _flush_soon(self):
+
+        if self._task is not None and (self._flush_task is None or self._flush_task.done()):
+
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+
+        if not self._pending:
+
+            return
+
+        pending, self._pending = self._pending, {}
+
+        items = list(pending.items())
+
+        try:
+
+            async with async_session() as db:
+
+                for start in range(0, len(items), ACTIVITY_FLUSH_CHUNK):
+
+                    chunk = dict(items[start:start + ACTIVITY_FLUSH_CHUNK])
+
+                    # Typed comparisons, so the keys bind as User.id does (BINARY(16) with UUID_STORAGE=binary)
+
+                    seen_at = case(*[(User.id == user_id, timestamp) for user_id, timestamp in chunk.items()])
+
+                    # Never move last_seen_at backwards when another worker flushed a later time first
+
+                    await db.execute(
+                        update(User)
+                        .where(User.id.in_(chunk), or_(User.last_seen_at.is_(None), User.last_seen_at < seen_at))
+                        .values(last_seen_at=seen_at)
+                        .execution_options(synchronize_session=False)
+                    )
+
+                await db.commit()
+
+            self.flushed += len(items)
+
+        except SQLAlchemyError as se:
+
+            logger.error(f'Error while flushing last seen times {se}')
+
+        except Exception as e:
+
+            logger.error(f'Unknown error while flushing last seen times {e}')
+
+    async def _run(self):
+
+        while True:
+
+            await asyncio.sleep(self.interval)
+
+            await self.flush()
+
+    def start(self):
+
+        if self._task is None:
+
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+
+        # Final flush so activity recorded since the last interval is not lost on shutdown
+
+        if self._task is not None:
+
+            self._task.cancel()
+
+            self._task = None
+
+        if self._flush_task is not None:
+
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+        await self.flush()
+
+    def stats(self):
+
+        return {'pending': len(self._pending), 'max_users': self.max_users, 'flushed': self.flushed, 'dropped': self.dropped, 'interval_seconds': self.interval}
+
+
+activity_buffer = ActivityBuffer(interval=ACTIVITY_FLUSH_SECONDS, max_users=ACTIVITY_BUFFER_MAX_USERS)
+
+
+def record_activity(user_id):
+
+    if ACTIVITY_TRACKING_ENABLED:
+
+        activity_buffer.record(user_id)
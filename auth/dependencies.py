@@ -1,43 +1,125 @@
-from fastapi import Request, Response, Depends
+from fastapi import Request, Response, Depends, HTTPException
 from fastapi.responses import JSONResponse
-from sqlalchemy.exc import SQLAlchemyError
-from .token import decode_access_token, decode_refresh_token, create_access_token
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from .token import decode_access_token, decode_refresh_token, create_access_token, ACCESS_TOKEN_EXPIRE
+from .revocation import RevocationFilter
+from .activity import record_activity
 import logging
 from utils.time_setting import get_current_time_with_tz, get_access_cookie_expire
 from datetime import datetime, UTC
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
+from database import get_db_lazy, get_read_db_lazy, is_pinned, pool_busy
 from uuid import UUID
 from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
 from models import User
+from utils.cache import TTLCache
+from utils.timing import timed
+from utils.metrics import AUTH_TOKEN_OUTCOMES
+import os
 
 logger = logging.getLogger(__name__)
 
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+
+# user_id -> (session_id, column snapshot); the session_id is compared on every hit so a rotated session misses
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Opt-in: access tokens are trusted from their claims unless their session was revoked on this worker,
+# so another worker's logout only takes effect here once the access token expires
+
+STATELESS_AUTH_ENABLED = os.getenv('STATELESS_AUTH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+revoked_sessions = RevocationFilter(ttl=ACCESS_TOKEN_EXPIRE * 60, bits=int(os.getenv('REVOCATION_FILTER_BITS', 1 << 20)))
+
+def invalidate_user_cache(user_id: UUID):
+
+    user_cache.pop(user_id)
+
+def revoke_session(session_id: UUID):
+
+    revoked_sessions.add(session_id)
+
+# Everything a request needs from the users row; password is deliberately left out and only loads if touched
+
+USER_SNAPSHOT_COLUMNS = (User.id, User.name, User.session_id, User.created_at, User.created_by)
+
+def _restore_user(snapshot: dict, db: AsyncSession):
+
+    # Rebuild a persistent instance without a query; unloaded columns (password) are expired and load on access
+
+    user = User(**snapshot)
+
+    make_transient_to_detached(user)
+
+    db.add(user)
+
+    return user
+
 async def clear_cookie(response: Response):
 
     response.delete_cookie(key='access_token', path='/', domain='127.0.0.1')
     response.delete_cookie(key='refresh_token', path='/', domain='127.0.0.1')
     return JSONResponse(status_code=401, content={'detail': 'Authentication Failed'})
 
-async def get_user_by_id(id: UUID, session_id: UUID, db: AsyncSession, response: Response):
+async def get_user_by_id(id: UUID, session_id: UUID, db: AsyncSession, response: Response, read_db: AsyncSession = None):
 
     try:
 
-        stmt = select(User).where(User.id == id)
+        cached = user_cache.get(id)
+
+        if cached and cached['session_id'] == session_id:
+
+            return _restore_user(snapshot=cached, db=db)
+
+        stmt = select(*USER_SNAPSHOT_COLUMNS).where(User.id == id)
+
+        snapshot = None
+
+        if read_db is not None and read_db is not db and not is_pinned(id):
+
+            try:
+
+                with timed('auth-db'):
+
+                    result = await read_db.execute(stmt)
 
-        result = await db.execute(stmt)
+                snapshot = result.mappings().one_or_none()
 
-        user = result.scalar_one_or_none()
+            except SQLAlchemyError as se:
 
-        if not user:
+                logger.warning(f'Replica read failed, using the primary {se}')
+
+        # A missing user or a different session may only be replication lag, so those fall through to the primary
+
+        if not snapshot or snapshot['session_id'] != session_id:
+
+            with timed('auth-db'):
+
+                result = await db.execute(stmt)
+
+            snapshot = result.mappings().one_or_none()
+
+        if not snapshot:
 
             return await clear_cookie(response=response)
 
-        if user.session_id != session_id:
+        if snapshot['session_id'] != session_id:
 
             return await clear_cookie(response=response)
 
-        return user
+        snapshot = dict(snapshot)
+
+        user_cache.set(id, snapshot)
+
+        return _restore_user(snapshot=snapshot, db=db)
+
+    except PoolTimeoutError:
+
+        raise pool_busy()
 
     except SQLAlchemyError as se:
 
@@ -61,27 +143,25 @@ async def user_token(request: Request, response: Response):
 
         if not access_token or not refresh_token:
 
+            AUTH_TOKEN_OUTCOMES.inc('rejected')
+
             return await clear_cookie(response=response)
 
         access_token_decoded = None
 
-        refresh_token_decoded = None
-
         try:
 
             access_token_decoded = await decode_access_token(access_token)
 
-        except Exception as e:
+        except HTTPException as he:
 
-            logger.error(f'Error in Access Token Decode {e}')
+            # Expired access tokens are routine and fall through to the refresh token
 
-        try:
-
-            refresh_token_decoded = await decode_refresh_token(refresh_token)
+            logger.debug(f'Access Token rejected {he.detail}')
 
         except Exception as e:
 
-            logger.error(f'Error in Refresh Token Decode')
+            logger.error(f'Error in Access Token Decode {e}')
 
         now = await get_current_time_with_tz()
 
@@ -91,25 +171,45 @@ async def user_token(request: Request, response: Response):
 
             if expire > now:
 
+                AUTH_TOKEN_OUTCOMES.inc('access')
+
                 return ('access', access_token_decoded)
 
+        refresh_token_decoded = None
+
+        try:
+
+            refresh_token_decoded = await decode_refresh_token(refresh_token)
+
+        except Exception as e:
+
+            logger.error(f'Error in Refresh Token Decode')
+
         if refresh_token_decoded:
 
             expire = datetime.fromtimestamp(refresh_token_decoded['exp'], tz=UTC)
 
             if expire > now:
 
+                AUTH_TOKEN_OUTCOMES.inc('refresh')
+
                 return ('refresh', refresh_token_decoded)
 
+        AUTH_TOKEN_OUTCOMES.inc('rejected')
+
         return await clear_cookie(response=response)
 
     except Exception as e:
 
         logger.error(f'Unknown Error in getting the token {e}')
 
+        AUTH_TOKEN_OUTCOMES.inc('rejected')
+
         return await clear_cookie(response=response)
 
-async def get_user(response: Response, db: AsyncSession = Depends(get_db), token = Depends(user_token)):
+async def get_user(response: Response, db: AsyncSession = Depends(get_db_lazy), read_db: AsyncSession = Depends(get_read_db_lazy), token = Depends(user_token)):
+
+    # Lazy sessions: the stateless and cached paths below never check out a connection
 
     user_token = token
 
@@ -119,17 +219,35 @@ async def get_user(response: Response, db: AsyncSession = Depends(get_db), token
 
     token_source, decoded_token = token
 
-    user = await get_user_by_id(id=UUID(decoded_token['id']), session_id=UUID(decoded_token['session_id']), db=db, response=response)
+    user_id = UUID(decoded_token['id'])
+
+    session_id = UUID(decoded_token['session_id'])
+
+    if STATELESS_AUTH_ENABLED and token_source == 'access':
+
+        if not revoked_sessions.might_contain(session_id):
+
+            record_activity(user_id)
+
+            return _restore_user(snapshot={'id': user_id, 'name': decoded_token['name'], 'session_id': session_id}, db=db)
+
+        if revoked_sessions.contains(session_id):
+
+            return await clear_cookie(response=response)
+
+    user = await get_user_by_id(id=user_id, session_id=session_id, db=db, response=response, read_db=read_db)
 
     if isinstance(user, JSONResponse):
 
         return user
 
+    record_activity(user.id)
+
     if token_source == 'refresh':
 
         data = {
-            'id': user.id,
-            'session_id': user.session_id,
+            'id': str(user.id),
+            'session_id': str(user.session_id),
             'name': user.name
         }
 
@@ -0,0 +1,208 @@
+from calendar import timegm
+from datetime import datetime
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+
+
+class TokenError(Exception):
+
+    pass
+
+
+class TokenExpiredError(TokenError):
+
+    pass
+
+
+def _b64encode(data: bytes):
+
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(data: bytes):
+
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def _to_timestamps(claims: dict):
+
+    for time_claim in ('exp', 'iat', 'nbf'):
+
+        if isinstance(claims.get(time_claim), datetime):
+
+            claims[time_claim] = timegm(claims[time_claim].utctimetuple())
+
+    return claims
+
+
+class JoseCodec:
+
+    # Reference backend: python-jose, resolving the key on every call
+
+    name = 'jose'
+
+    def __init__(self, secret: str, algorithm: str):
+
+        from jose import jwt
+
+        self._jwt = jwt
+
+        self.secret = secret
+
+        self.algorithm = algorithm
+
+    def encode(self, claims: dict):
+
+        from jose import JWTError
+
+        try:
+
+            return self._jwt.encode(dict(claims), key=self.secret, algorithm=self.algorithm)
+
+        except JWTError as je:
+
+            raise TokenError(str(je))
+
+    def decode(self, token: str):
+
+        from jose import JWTError, ExpiredSignatureError
+
+        try:
+
+            return self._jwt.decode(token, key=self.secret, algorithms=[self.algorithm])
+
+        except ExpiredSignatureError as ee:
+
+            raise TokenExpiredError(str(ee))
+
+        except JWTError as je:
+
+            raise TokenError(str(je))
+
+
+class HMACCodec:
+
+    # Stdlib HS256/384/512 backend producing byte-identical tokens to python-jose:
+    # the keyed HMAC state and the encoded header segment are built once and reused
+
+    name = 'hmac'
+
+    digests = {'HS256': hashlib.sha256, 'HS384': hashlib.sha384, 'HS512': hashlib.sha512}
+
+    def __init__(self, secret: str, algorithm: str):
+
+        if algorithm not in self.digests:
+
+            raise TokenError(f'Algorithm {algorithm} is not supported by the hmac backend')
+
+        self.algorithm = algorithm
+
+        self._mac = hmac.new(secret.encode('utf-8'), digestmod=self.digests[algorithm])
+
+        self._header = _b64encode(json.dumps({'typ': 'JWT', 'alg': algorithm}, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+    def _sign(self, signing_input: bytes):
+
+        mac = self._mac.copy()
+
+        mac.update(signing_input)
+
+        return mac.digest()
+
+    def encode(self, claims: dict):
+
+        try:
+
+            payload = _b64encode(json.dumps(_to_timestamps(dict(claims)), separators=(',', ':')).encode('utf-8'))
+
+        except (TypeError, ValueError) as e:
+
+            raise TokenError(f'Claims are not JSON serializable {e}')
+
+        signing_input = self._header + b'.' + payload
+
+        return (signing_input + b'.' + _b64encode(self._sign(signing_input))).decode('utf-8')
+
+    def decode(self, token: str):
+
+        try:
+
+            raw = token.encode('utf-8')
+
+            signing_input, signature = raw.rsplit(b'.', 1)
+
+            header, payload = signing_input.split(b'.', 1)
+
+            if header != self._header:
+
+                # Same algorithm with a different header encoding is still acceptable; anything else is rejected
+
+                parsed_header = json.loads(_b64decode(header))
+
+                if not isinstance(parsed_header, dict) or parsed_header.get('alg') != self.algorithm:
+
+                    raise TokenError('The specified alg value is not allowed')
+
+            if not hmac.compare_digest(self._sign(signing_input), _b64decode(signature)):
+
+                raise TokenError('Signature verification failed.')
+
+            claims = json.loads(_b64decode(payload))
+
+        except TokenError:
+
+            raise
+
+        except (ValueError, binascii.Error, UnicodeError) as e:
+
+            raise TokenError(f'Invalid token {e}')
+
+        if not isinstance(claims, dict):
+
+            raise TokenError('Invalid payload string: must be a json object')
+
+        now = timegm(time.gmtime())
+
+        try:
+
+            if 'exp' in claims and int(claims['exp']) < now:
+
+                raise TokenExpiredError('Signature has expired.')
+
+            if 'nbf' in claims and int(claims['nbf']) > now:
+
+                raise TokenError('The token is not yet valid (nbf)')
+
+        except (TypeError, ValueError):
+
+            raise TokenError('Time claims must be integers')
+
+        if 'aud' in claims:
+
+            # python-jose rejects audience-bound tokens when no audience is expected; keep the same contract
+
+            raise TokenError('Invalid audience')
+
+        return claims
+
+
+BACKENDS = {JoseCodec.name: JoseCodec, HMACCodec.name: HMACCodec}
+
+
+def build_codec(secret: str, algorithm: str, backend: str = 'hmac'):
+
+    if backend not in BACKENDS:
+
+        raise TokenError(f'Unknown JWT backend {backend}')
+
+    if backend == HMACCodec.name and algorithm not in HMACCodec.digests:
+
+        # Asymmetric algorithms stay on the reference implementation
+
+        return JoseCodec(secret, algorithm)
+
+    return BACKENDS[backend](secret, algorithm)
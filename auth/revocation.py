@@ -0,0 +1,72 @@
+from uuid import UUID
+import hashlib
+import time
+
+
+class RevocationFilter:
+
+    # Session ids revoked on this worker during the last access-token lifetime.
+    # The Bloom filter answers "definitely not revoked" without touching the exact set; the exact set resolves hits.
+    # Bloom bits cannot be removed, so two generations rotate every ttl seconds and each entry lives ttl to 2 * ttl.
+
+    def __init__(self, ttl: float, bits: int = 1 << 20, hashes: int = 4):
+
+        self.ttl = ttl
+
+        self.bits = bits
+
+        self.hashes = hashes
+
+        self._current = bytearray(bits // 8)
+
+        self._previous = bytearray(bits // 8)
+
+        self._rotated_at = time.monotonic()
+
+        self._revoked = {}
+
+    def _positions(self, session_id: UUID):
+
+        digest = hashlib.blake2b(session_id.bytes, digest_size=4 * self.hashes).digest()
+
+        return [int.from_bytes(digest[i * 4:(i + 1) * 4], 'little') % self.bits for i in range(self.hashes)]
+
+    def _rotate(self, now: float):
+
+        if now - self._rotated_at < self.ttl:
+
+            return
+
+        self._previous = self._current if now - self._rotated_at < 2 * self.ttl else bytearray(self.bits // 8)
+
+        self._current = bytearray(self.bits // 8)
+
+        self._rotated_at = now
+
+        self._revoked = {key: expires for key, expires in self._revoked.items() if expires > now}
+
+    def add(self, session_id: UUID):
+
+        now = time.monotonic()
+
+        self._rotate(now)
+
+        for position in self._positions(session_id):
+
+            self._current[position >> 3] |= 1 << (position & 7)
+
+        self._revoked[session_id] = now + self.ttl
+
+    def might_contain(self, session_id: UUID):
+
+        self._rotate(time.monotonic())
+
+        positions = self._positions(session_id)
+
+        return all(self._current[p >> 3] & (1 << (p & 7)) for p in positions) or all(self._previous[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def contains(self, session_id: UUID):
+
+        expires = self._revoked.get(session_id)
+
+        return expires is not None and expires > time.monotonic()
@@ -1,16 +1,82 @@
 from passlib.context import CryptContext
 from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.timing import timed
+from utils.metrics import BCRYPT_SECONDS
+import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
 pwd_context = CryptContext(schemes=['bcrypt'])
 
+# bcrypt releases the GIL, so a thread pool gives real parallelism without the pickling cost of a process pool
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', PASSWORD_HASH_WORKERS * 4))
+
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+
+_in_flight = 0
+
+
+async def _run_in_pool(func, *args):
+
+    global _in_flight
+
+    if _in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+
+        logger.warning('Password hashing pool saturated')
+
+        raise HTTPException(status_code=503, detail='Server busy, please retry', headers={'Retry-After': '1'})
+
+    _in_flight += 1
+
+    try:
+
+        loop = asyncio.get_running_loop()
+
+        with timed('bcrypt'), BCRYPT_SECONDS.time(func.__name__):
+
+            return await asyncio.wait_for(loop.run_in_executor(_executor, func, *args), timeout=PASSWORD_HASH_TIMEOUT)
+
+    except asyncio.TimeoutError:
+
+        logger.error('Timed out waiting for the password hashing pool')
+
+        raise HTTPException(status_code=503, detail='Server busy, please retry', headers={'Retry-After': '1'})
+
+    finally:
+
+        _in_flight -= 1
+
+
+def shutdown_pool(wait: bool = True):
+
+    _executor.shutdown(wait=wait, cancel_futures=True)
+
+
+async def warm_up_pool():
+
+    # Loads the bcrypt backend and starts every worker thread, so the first logins after a deploy do not pay for it
+
+    loop = asyncio.get_running_loop()
+
+    await asyncio.gather(*(loop.run_in_executor(_executor, pwd_context.dummy_verify) for _ in range(PASSWORD_HASH_WORKERS)))
+
+
 async def get_hash(plain_password: str):
 
     try:
 
-        return pwd_context.hash(plain_password)
+        return await _run_in_pool(pwd_context.hash, plain_password)
 
     except HTTPException as he:
 
@@ -22,11 +88,32 @@ async def get_hash(plain_password: str):
 
         raise HTTPException(status_code=500, detail='Internal Server Error while hashing the password')
 
+async def get_hashes(plain_passwords: list):
+
+    # Keeps at most PASSWORD_HASH_WORKERS batch items in the pool so interactive logins still find queue room;
+    # failures are returned per item instead of aborting the batch
+
+    semaphore = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+    async def hash_one(plain_password: str):
+
+        async with semaphore:
+
+            try:
+
+                return await get_hash(plain_password=plain_password)
+
+            except HTTPException as he:
+
+                return he
+
+    return await asyncio.gather(*(hash_one(plain_password) for plain_password in plain_passwords))
+
 async def verify_password(plain_password: str, hashed_password: str):
 
     try:
 
-        is_valid =  pwd_context.verify(plain_password, hashed_password)
+        is_valid = await _run_in_pool(pwd_context.verify, plain_password, hashed_password)
 
         return is_valid
 
@@ -38,4 +125,4 @@ async def verify_password(plain_password: str, hashed_password: str):
 
         logger.error(f'Unknown error in Password Checking {e}')
 
-        raise HTTPException(status_code=500, detail='Internal Server Error while checking the password')
\ No newline at end of file
+        raise HTTPException(status_code=500, detail='Internal Server Error while checking the password')
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+LOGIN_THROTTLE_ENABLED = os.getenv('LOGIN_THROTTLE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+LOGIN_THROTTLE_BACKEND = os.getenv('LOGIN_THROTTLE_BACKEND', 'memory')
+
+LOGIN_THROTTLE_SQLITE_PATH = os.getenv('LOGIN_THROTTLE_SQLITE_PATH', '/tmp/login_throttle.sqlite3')
+
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv('LOGIN_THROTTLE_MAX_KEYS', 100000))
+
+LOGIN_USER_RATE = float(os.getenv('LOGIN_USER_RATE', 10))
+
+LOGIN_USER_BURST = float(os.getenv('LOGIN_USER_BURST', 5))
+
+LOGIN_IP_RATE = float(os.getenv('LOGIN_IP_RATE', 60))
+
+LOGIN_IP_BURST = float(os.getenv('LOGIN_IP_BURST', 20))
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, burst: float):
+
+    # rate is tokens per second; returns the bucket after taking one token and the seconds to wait if it was empty
+
+    tokens = min(burst, tokens + (now - updated) * rate)
+
+    if tokens >= 1:
+
+        return tokens - 1, 0.0
+
+    return tokens, (1 - tokens) / rate
+
+
+# A backend implements async take(key, rate, burst) returning 0 when a token was taken, else the seconds to wait
+
+class MemoryBackend:
+
+    # Per-process buckets; the least recently used key is evicted once max_keys is reached
+
+    def __init__(self, max_keys: int):
+
+        self.max_keys = max_keys
+
+        self._buckets: OrderedDict = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float):
+
+        now = time.monotonic()
+
+        tokens, updated = self._buckets.get(key, (burst, now))
+
+        tokens, wait = refill(tokens, updated, now, rate, burst)
+
+        self._buckets[key] = (tokens, now)
+
+        self._buckets.move_to_end(key)
+
+        while len(self._buckets) > self.max_keys:
+
+            self._buckets.popitem(last=False)
+
+        return wait
+
+
+class SQLiteBackend:
+
+    # Buckets in a local SQLite file so every worker on the host shares them; stand-in for a networked store
+
+    def __init__(self, path: str, max_keys: int):
+
+        self.path = path
+
+        self.max_keys = max_keys
+
+        self._local = threading.local()
+
+        self._takes = 0
+
+    def _connection(self):
+
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+            connection.execute('PRAGMA journal_mode=WAL')
+
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)')
+
+            self._local.connection = connection
+
+        return connection
+
+    def _take(self, key: str, rate: float, burst: float, evict: bool):
+
+        connection = self._connection()
+
+        now = time.time()
+
+        connection.execute('BEGIN IMMEDIATE')
+
+        try:
+
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+
+            tokens, wait = refill(*(row or (burst, now)), now, rate, burst)
+
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+
+            if evict:
+
+                connection.execute('DELETE FROM buckets WHERE key IN (SELECT key FROM buckets ORDER BY updated DESC LIMIT -1 OFFSET ?)', (self.max_keys,))
+
+            connection.execute('COMMIT')
+
+        except Exception:
+
+            connection.execute('ROLLBACK')
+
+            raise
+
+        return wait
+
+    async def take(self, key: str, rate: float, burst: float):
+
+        self._takes += 1
+
+        return await asyncio.to_thread(self._take, key, rate, burst, self._takes % 1000 == 0)
+
+
+def build_backend(name: str):
+
+    if name == 'sqlite':
+
+        return SQLiteBackend(path=LOGIN_THROTTLE_SQLITE_PATH, max_keys=LOGIN_THROTTLE_MAX_KEYS)
+
+    if name != 'memory':
+
+        logger.warning(f'Unknown login throttle backend {name}, using memory')
+
+    return MemoryBackend(max_keys=LOGIN_THROTTLE_MAX_KEYS)
+
+
+backend = build_backend(LOGIN_THROTTLE_BACKEND)
+
+
+async def check_login_allowed(name: str, client_ip: str):
+
+    if not LOGIN_THROTTLE_ENABLED:
+
+        return
+
+    try:
+
+        wait = await backend.take(f'ip:{client_ip}', LOGIN_IP_RATE / 60, LOGIN_IP_BURST)
+
+        if not wait:
+
+            # The name is whatever the client sent, so the key holds a fixed-size digest of it rather than the string
+
+            name_key = hashlib.blake2b(name.encode(), digest_size=16).hexdigest()
+
+            wait = await backend.take(f'user:{name_key}', LOGIN_USER_RATE / 60, LOGIN_USER_BURST)
+
+    except Exception as e:
+
+        # Fail open: a broken limiter store should not lock every user out
+
+        logger.error(f'Login throttle backend error {e}')
+
+        return
+
+    if wait:
+
+        raise HTTPException(status_code=429, detail='Too many login attempts, please retry later', headers={'Retry-After': str(math.ceil(wait))})
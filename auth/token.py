@@ -4,8 +4,13 @@ from utils.time_setting import get_current_time_with_tz
 from datetime import timedelta
 from dotenv import load_dotenv
 import os
-from jose import jwt, JWTError, ExpiredSignatureError
+from .jwt_codec import build_codec, TokenError, TokenExpiredError
+from utils.cache import TTLCache
+from utils.timing import timed
+from utils.metrics import JWT_SECONDS
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +26,51 @@ REFRESH_TOKEN_SECRET = str(os.getenv('USER_REFRESH_TOKEN_SECRET'))
 
 ALGORITHM = str(os.getenv('ALGORITHM'))
 
+JWT_BACKEND = os.getenv('JWT_BACKEND', 'hmac')
+
+# Keys and algorithms are resolved once here rather than on every encode/decode
+
+access_codec = build_codec(ACCESS_TOKEN_SECRET, ALGORITHM, backend=JWT_BACKEND)
+
+refresh_codec = build_codec(REFRESH_TOKEN_SECRET, ALGORITHM, backend=JWT_BACKEND)
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', 300))
+
+# (token kind, sha256 of token) -> verified claims; entries never outlive the token's own exp
+
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+
+def warm_up_codecs():
+
+    # One round trip per codec imports and initializes its backend outside any request; nothing is cached
+
+    claims = {'id': 'warm-up', 'exp': int(time.time()) + 60}
+
+    for codec in (access_codec, refresh_codec):
+
+        codec.decode(codec.encode(claims))
+
+
+def _cached_claims(kind: str, token: str):
+
+    key = (kind, hashlib.sha256(token.encode()).digest())
+
+    claims = token_cache.get(key)
+
+    return key, (dict(claims) if claims is not None else None)
+
+
+def _cache_claims(key: tuple, claims: dict):
+
+    exp = claims.get('exp')
+
+    if isinstance(exp, (int, float)):
+
+        token_cache.set(key, dict(claims), ttl=exp - time.time())
+
 
 async def create_access_token(data: dict, expires: Optional[int] = None):
 
@@ -38,9 +88,11 @@ async def create_access_token(data: dict, expires: Optional[int] = None):
 
         to_encode.update({'exp': expire})
 
-        return jwt.encode(to_encode, key=ACCESS_TOKEN_SECRET, algorithm=ALGORITHM)
+        with timed('jwt'), JWT_SECONDS.time('encode', 'access'):
 
-    except JWTError as je:
+            return access_codec.encode(to_encode)
+
+    except TokenError as je:
 
         logger.error(f'Error in access token creation {je}')
 
@@ -63,17 +115,29 @@ async def decode_access_token(token: str):
 
         if not token is None:
 
-            return jwt.decode(token,key=ACCESS_TOKEN_SECRET, algorithms=[ALGORITHM])
+            key, claims = _cached_claims('access', token)
+
+            if claims is not None:
+
+                return claims
+
+            with timed('jwt'), JWT_SECONDS.time('decode', 'access'):
+
+                claims = access_codec.decode(token)
+
+            _cache_claims(key, claims)
+
+            return claims
 
         else:
 
             raise HTTPException(status_code=401, detail='Error when getting the access token')
 
-    except ExpiredSignatureError:
+    except TokenExpiredError:
 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Access token expired')
 
-    except JWTError as je:
+    except TokenError as je:
 
         logger.error(f'Error in access token decode {je}')
 
@@ -99,17 +163,29 @@ async def decode_refresh_token(token: str):
 
         if not token is None:
 
-            return jwt.decode(token=token, key=REFRESH_TOKEN_SECRET, algorithms=[ALGORITHM])
+            key, claims = _cached_claims('refresh', token)
+
+            if claims is not None:
+
+                return claims
+
+            with timed('jwt'), JWT_SECONDS.time('decode', 'refresh'):
+
+                claims = refresh_codec.decode(token)
+
+            _cache_claims(key, claims)
+
+            return claims
 
         else:
 
             raise HTTPException(status_code=401, detail='Error when getting the refresh token')
 
-    except ExpiredSignatureError:
+    except TokenExpiredError:
 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Access token expired')
 
-    except JWTError as je:
+    except TokenError as je:
 
         logger.error(f'Error in refresh token decode {je}')
 
@@ -145,9 +221,11 @@ async def create_refresh_token(data: dict, expires: Optional[int] = None):
 
         to_encode.update({'exp': expire})
 
-        return jwt.encode(to_encode, key=REFRESH_TOKEN_SECRET, algorithm=ALGORITHM)
+        with timed('jwt'), JWT_SECONDS.time('encode', 'refresh'):
+
+            return refresh_codec.encode(to_encode)
 
-    except JWTError as je:
+    except TokenError as je:
 
         logger.error(f'Error in refresh token creation {je}')
 
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, UTC
+from uuid import uuid4
+
+from benchmarks.auth_bench import configure_environment, ROOT
+
+STORAGES = ('native', 'binary')
+
+
+async def check():
+
+    from sqlalchemy import insert, select
+    from database import async_engine, async_session, Base
+    from models import User
+    from auth.activity import ActivityBuffer
+    from utils.ids import uuid7
+
+    async with async_engine.begin() as conn:
+
+        await conn.run_sync(Base.metadata.create_all)
+
+    user_ids = [uuid7() for _ in range(3)]
+
+    async with async_session() as db:
+
+        await db.execute(insert(User), [{'id': user_id, 'name': f'activity-{user_id.hex}', 'password': '-', 'session_id': uuid4(), 'created_at': datetime.now(UTC).replace(tzinfo=None)} for user_id in user_ids])
+
+        await db.commit()
+
+    buffer = ActivityBuffer(interval=60, max_users=10)
+
+    # Two of three users seen; the third must stay untouched
+
+    for user_id in user_ids[:2]:
+
+        buffer.record(user_id)
+
+    await buffer.flush()
+
+    async with async_session() as db:
+
+        seen = dict((await db.execute(select(User.id, User.last_seen_at).where(User.id.in_(user_ids)))).all())
+
+    await async_engine.dispose()
+
+    return [user_id for user_id in user_ids[:2] if seen.get(user_id) is None] + [user_id for user_id in user_ids[2:] if seen.get(user_id) is not None]
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Flush the last_seen_at buffer and fail unless the rows were written, in every UUID storage mode')
+
+    parser.add_argument('--storage', choices=STORAGES, default=None, help='Check one mode in this process; by default each mode runs in its own process')
+
+    args = parser.parse_args(argv)
+
+    if args.storage is None:
+
+        # UUID_STORAGE is read when the models are imported, so every mode needs a fresh interpreter
+
+        failed = [storage for storage in STORAGES if subprocess.run([sys.executable, '-m', 'benchmarks.activity_flush', '--storage', storage], cwd=ROOT, env={**os.environ, 'UUID_STORAGE': storage}).returncode]
+
+        if failed:
+
+            raise SystemExit(f"last_seen_at flush failed with UUID_STORAGE={', '.join(failed)}")
+
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        configure_environment(f"sqlite+aiosqlite:///{os.path.join(workdir, 'activity.db')}")
+
+        wrong = asyncio.run(check())
+
+    print(f"{args.storage:<8} {'FAIL ' + ', '.join(map(str, wrong)) if wrong else 'ok'}", file=sys.stderr)
+
+    if wrong:
+
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, UTC
+from uuid import uuid4
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('token', 'login', 'logout', 'create-user', 'delete-user')
+
+PASSWORD = 'bench-password'
+
+
+def configure_environment(database_url: str):
+
+    # Must run before the app is imported: database.py and auth/token.py read these at import time
+
+    os.environ['DATABASE_URL'] = database_url
+
+    os.environ.setdefault('ACCESS_TOKEN_EXPIRE', '15')
+
+    os.environ.setdefault('REFRESH_TOKEN_EXPIRE', '7')
+
+    os.environ.setdefault('USER_ACCESS_TOKEN_SECRET', 'bench-access-secret')
+
+    os.environ.setdefault('USER_REFRESH_TOKEN_SECRET', 'bench-refresh-secret')
+
+    os.environ.setdefault('ALGORITHM', 'HS256')
+
+    # The login scenario deliberately hammers one account, which the login throttle would otherwise reject
+
+    os.environ.setdefault('LOGIN_THROTTLE_ENABLED', 'false')
+
+    if ROOT not in sys.path:
+
+        sys.path.insert(0, ROOT)
+
+
+def git_commit():
+
+    try:
+
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+    except Exception:
+
+        return None
+
+
+def percentile(sorted_values: list, fraction: float):
+
+    if not sorted_values:
+
+        return None
+
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+
+    return sorted_values[index]
+
+
+def summarize(latencies: list, errors: int, elapsed: float):
+
+    ordered = sorted(latencies)
+
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 4),
+        'throughput_rps': round((len(latencies) + errors) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(ordered), 3) if ordered else None,
+            'p50': percentile(ordered, 0.50),
+            'p90': percentile(ordered, 0.90),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else None,
+        },
+    }
+
+
+class Bench:
+
+    def __init__(self):
+
+        from main import app
+        from database import async_engine, async_session, Base
+        from models import User
+        from auth.security import pwd_context
+        from auth.token import create_access_token, create_refresh_token
+        from auth.dependencies import get_user
+        from fastapi import Depends
+        from fastapi.responses import JSONResponse
+        import httpx
+
+        self.async_engine = async_engine
+
+        self.async_session = async_session
+
+        self.Base = Base
+
+        self.User = User
+
+        self.create_access_token = create_access_token
+
+        self.create_refresh_token = create_refresh_token
+
+        self.password_hash = pwd_context.hash(PASSWORD)
+
+        async def whoami(user = Depends(get_user)):
+
+            if isinstance(user, JSONResponse):
+
+                return user
+
+            return {'id': str(user.id)}
+
+        # A route whose only work is authentication, registered on this process's app instance only
+
+        if not any(getattr(route, 'path', None) == '/__bench/whoami' for route in app.routes):
+
+            app.add_api_route('/__bench/whoami', whoami, methods=['GET'])
+
+        # The host deliberately differs from the cookie domain so the client jar never replays Set-Cookie; every request carries explicit cookies
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='https://bench.local')
+
+    async def setup(self):
+
+        async with self.async_engine.begin() as conn:
+
+            await conn.run_sync(self.Base.metadata.drop_all)
+
+            await conn.run_sync(self.Base.metadata.create_all)
+
+        self.admin = (await self.seed_users(1, prefix='admin'))[0]
+
+    async def seed_users(self, count: int, prefix: str):
+
+        from sqlalchemy import insert
+
+        rows = [{'id': uuid4(), 'name': f'{prefix}-{uuid4().hex[:12]}', 'password': self.password_hash, 'session_id': uuid4(), 'created_at': datetime.now(UTC).replace(tzinfo=None)} for _ in range(count)]
+
+        async with self.async_session() as db:
+
+            await db.execute(insert(self.User), rows)
+
+            await db.commit()
+
+        return rows
+
+    async def cookies_for(self, user: dict):
+
+        data = {'id': str(user['id']), 'name': user['name'], 'session_id': str(user['session_id'])}
+
+        access_token = await self.create_access_token(data=data)
+
+        refresh_token = await self.create_refresh_token(data=data)
+
+        return f'access_token={access_token}; refresh_token={refresh_token}'
+
+    async def prepare(self, scenario: str, count: int):
+
+        # Returns one request factory per planned request; per-request fixtures are built here so they stay out of the timed section
+
+        if scenario == 'token':
+
+            cookie = await self.cookies_for(self.admin)
+
+            return [lambda: self.client.get('/__bench/whoami', headers={'cookie': cookie})] * count
+
+        if scenario == 'login':
+
+            # A dedicated user, since every login rotates the session that other scenarios' cookies are bound to
+
+            name = (await self.seed_users(1, prefix='login'))[0]['name']
+
+            return [lambda: self.client.post('/login', json={'name': name, 'password': PASSWORD})] * count
+
+        if scenario == 'create-user':
+
+            cookie = await self.cookies_for(self.admin)
+
+            names = [f'created-{uuid4().hex[:16]}' for _ in range(count)]
+
+            return [lambda name=name: self.client.post('/create-user', json={'name': name, 'password': PASSWORD}, headers={'cookie': cookie}) for name in names]
+
+        users = await self.seed_users(count, prefix=scenario)
+
+        cookies = [await self.cookies_for(user) for user in users]
+
+        if scenario == 'logout':
+
+            return [lambda cookie=cookie: self.client.post('/logout', headers={'cookie': cookie}) for cookie in cookies]
+
+        return [lambda cookie=cookie: self.client.delete('/delete-user', headers={'cookie': cookie}) for cookie in cookies]
+
+    async def run_level(self, scenario: str, concurrency: int, count: int):
+
+        factories = await self.prepare(scenario, count)
+
+        queue = iter(factories)
+
+        latencies = []
+
+        errors = 0
+
+        async def worker():
+
+            nonlocal errors
+
+            for factory in queue:
+
+                started = time.perf_counter()
+
+                response = await factory()
+
+                elapsed = (time.perf_counter() - started) * 1000
+
+                if response.status_code >= 400:
+
+                    errors += 1
+
+                else:
+
+                    latencies.append(round(elapsed, 3))
+
+        started = time.perf_counter()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        return summarize(latencies, errors, time.perf_counter() - started)
+
+    async def count_queries(self, factory):
+
+        from sqlalchemy import event
+
+        statements = []
+
+        checkouts = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+
+            statements.append(statement.split(None, 1)[0].upper())
+
+        def record_checkout(dbapi_connection, connection_record, connection_proxy):
+
+            checkouts.append(connection_record)
+
+        engine = self.async_engine.sync_engine
+
+        event.listen(engine, 'before_cursor_execute', record)
+
+        event.listen(engine, 'checkout', record_checkout)
+
+        try:
+
+            response = await factory()
+
+        finally:
+
+            event.remove(engine, 'before_cursor_execute', record)
+
+            event.remove(engine, 'checkout', record_checkout)
+
+        return response.status_code, statements, len(checkouts)
+
+    async def count_statements(self, scenario: str):
+
+        return await self.count_queries((await self.prepare(scenario, 1))[0])
+
+    async def close(self):
+
+        await self.client.aclose()
+
+        await self.async_engine.dispose()
+
+
+async def run(args):
+
+    bench = Bench()
+
+    await bench.setup()
+
+    results = []
+
+    statements = {}
+
+    try:
+
+        for scenario in args.scenarios:
+
+            statements[scenario] = (await bench.count_statements(scenario))[1]
+
+            for concurrency in args.concurrency:
+
+                summary = await bench.run_level(scenario, concurrency, args.requests)
+
+                results.append({'scenario': scenario, 'concurrency': concurrency, **summary})
+
+                print(f"{scenario:<12} c={concurrency:<4} {summary['throughput_rps']:>9} req/s  p50={summary['latency_ms']['p50']}ms  p99={summary['latency_ms']['p99']}ms  errors={summary['errors']}", file=sys.stderr)
+
+    finally:
+
+        await bench.close()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(UTC).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'database_url': os.environ['DATABASE_URL'],
+            'requests_per_level': args.requests,
+        },
+        'statements_per_request': statements,
+        'results': results,
+    }
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description='In-process load benchmark for the auth endpoints')
+
+    parser.add_argument('--scenarios', type=lambda value: value.split(','), default=list(SCENARIOS), help=f'Comma separated subset of {",".join(SCENARIOS)}')
+
+    parser.add_argument('--concurrency', type=lambda value: [int(level) for level in value.split(',')], default=[1, 8, 32], help='Comma separated concurrency levels')
+
+    parser.add_argument('--requests', type=int, default=100, help='Requests per scenario and concurrency level')
+
+    parser.add_argument('--database-url', default=None, help='Defaults to a throwaway SQLite file via aiosqlite')
+
+    parser.add_argument('--output', default=None, help='Write the JSON results here instead of stdout')
+
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+
+    if unknown:
+
+        parser.error(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+    return args
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        configure_environment(args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+
+        report = asyncio.run(run(args))
+
+    payload = json.dumps(report, indent=2)
+
+    if args.output:
+
+        with open(args.output, 'w') as output:
+
+            output.write(payload + '\n')
+
+    else:
+
+        print(payload)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, UTC
+from uuid import uuid4
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+
+    sys.path.insert(0, ROOT)
+
+from auth.jwt_codec import BACKENDS, TokenError, TokenExpiredError
+
+ALGORITHMS = ('HS256', 'HS384', 'HS512')
+
+SECRET = 'bench-secret'
+
+
+def sample_claims(expires_in: timedelta = timedelta(minutes=15)):
+
+    return {'id': str(uuid4()), 'name': 'bench-user', 'session_id': str(uuid4()), 'exp': datetime.now(UTC) + expires_in}
+
+
+def expect_error(codec, token: str, error: type):
+
+    try:
+
+        codec.decode(token)
+
+    except error:
+
+        return
+
+    raise AssertionError(f'{codec.name} accepted a token it should reject with {error.__name__}')
+
+
+def check_compatibility():
+
+    # Every backend must produce byte-identical tokens and accept/reject exactly what the others do
+
+    for algorithm in ALGORITHMS:
+
+        codecs = [backend(SECRET, algorithm) for backend in BACKENDS.values()]
+
+        claims = sample_claims()
+
+        tokens = {codec.name: codec.encode(claims) for codec in codecs}
+
+        assert len(set(tokens.values())) == 1, f'{algorithm}: backends produced different tokens {tokens}'
+
+        for token in tokens.values():
+
+            decoded = [codec.decode(token) for codec in codecs]
+
+            assert all(claims_ == decoded[0] for claims_ in decoded), f'{algorithm}: backends decoded different claims'
+
+        token = next(iter(tokens.values()))
+
+        header, payload, signature = token.split('.')
+
+        expired = codecs[0].encode(sample_claims(expires_in=timedelta(minutes=-1)))
+
+        other_key = type(codecs[0])('another-secret', algorithm).encode(claims)
+
+        foreign_alg = BACKENDS['jose'](SECRET, 'HS512' if algorithm != 'HS512' else 'HS256').encode(claims)
+
+        for codec in codecs:
+
+            expect_error(codec, expired, TokenExpiredError)
+
+            expect_error(codec, other_key, TokenError)
+
+            expect_error(codec, foreign_alg, TokenError)
+
+            expect_error(codec, f'{header}.{payload}.{signature[:-2]}AA', TokenError)
+
+            expect_error(codec, 'not-a-token', TokenError)
+
+
+def bench(number: int):
+
+    results = []
+
+    claims = sample_claims()
+
+    for algorithm in ALGORITHMS:
+
+        for name, backend in BACKENDS.items():
+
+            codec = backend(SECRET, algorithm)
+
+            token = codec.encode(claims)
+
+            encode = timeit.timeit(lambda: codec.encode(claims), number=number)
+
+            decode = timeit.timeit(lambda: codec.decode(token), number=number)
+
+            results.append({'backend': name, 'algorithm': algorithm, 'encode_us': round(encode / number * 1e6, 2), 'decode_us': round(decode / number * 1e6, 2)})
+
+            print(f"{name:<6} {algorithm}  encode {results[-1]['encode_us']:>8} us  decode {results[-1]['decode_us']:>8} us", file=sys.stderr)
+
+    return results
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Compare JWT codec backends for compatibility and speed')
+
+    parser.add_argument('--number', type=int, default=20000, help='Iterations per measurement')
+
+    parser.add_argument('--output', default=None)
+
+    args = parser.parse_args(argv)
+
+    check_compatibility()
+
+    print('compatibility: ok', file=sys.stderr)
+
+    payload = json.dumps({'results': bench(args.number)}, indent=2)
+
+    if args.output:
+
+        with open(args.output, 'w') as output:
+
+            output.write(payload + '\n')
+
+    else:
+
+        print(payload)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+from benchmarks.auth_bench import configure_environment, ROOT
+
+
+def explain_sql(statement, dialect):
+
+    # Literal values keep the plan independent of the driver's parameter style; the rows come back untyped
+
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+
+    return prefix + str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+# Queries whose plan must name a specific index; for the rest any index will do (primary key and unique index names differ per dialect)
+
+REQUIRED_INDEXES = {'blogs_page': 'ix_blogs_user_id_id'}
+
+
+def plan_lines(dialect: str, rows: list):
+
+    if dialect == 'sqlite':
+
+        return [row.detail for row in rows]
+
+    if dialect == 'mysql':
+
+        return [f'{row.table}: type={row.type} key={row.key}' for row in rows]
+
+    if dialect == 'postgresql':
+
+        return [row[0].strip() for row in rows]
+
+    raise SystemExit(f'No plan check for dialect {dialect}')
+
+
+def plan_problems(dialect: str, lines: list, required_index):
+
+    if dialect == 'sqlite':
+
+        # "SCAN users" reads the whole table; index use reads "SEARCH users USING INDEX ..." or "SCAN ... USING COVERING INDEX ..."
+
+        problems = [line for line in lines if line.startswith('SCAN ') and ' USING ' not in line]
+
+    elif dialect == 'mysql':
+
+        problems = [line for line in lines if 'type=ALL' in line]
+
+    else:
+
+        problems = [line for line in lines if 'Seq Scan' in line]
+
+    if required_index and not any(required_index in line for line in lines):
+
+        problems.append(f'{required_index} not used')
+
+    return problems
+
+
+async def check():
+
+    from database import async_engine
+    from utils.warmup import hot_statements
+
+    failures = []
+
+    async with async_engine.connect() as connection:
+
+        dialect = connection.dialect.name
+
+        if dialect == 'postgresql':
+
+            # Tiny tables make a sequential scan cheapest; forbid it to see whether an index is usable at all
+
+            await connection.exec_driver_sql('SET enable_seqscan = off')
+
+        for name, statement in hot_statements().items():
+
+            required_index = REQUIRED_INDEXES.get(name)
+
+            rows = (await connection.exec_driver_sql(explain_sql(statement, connection.dialect))).all()
+
+            lines = plan_lines(dialect, rows)
+
+            problems = plan_problems(dialect, lines, required_index)
+
+            print(f"{name:<16} {'FAIL ' + '; '.join(problems) if problems else 'ok'}  [{' | '.join(lines)}]", file=sys.stderr)
+
+            if problems:
+
+                failures.append(name)
+
+    await async_engine.dispose()
+
+    return failures
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='EXPLAIN the hot queries and fail if any of them stops using an index')
+
+    parser.add_argument('--database-url', default=None, help='Check an already migrated database instead of a fresh SQLite one')
+
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        configure_environment(args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'plans.db')}")
+
+        if args.database_url is None:
+
+            from alembic import command
+            from alembic.config import Config
+
+            command.upgrade(Config(os.path.join(ROOT, 'alembic.ini')), 'head')
+
+        failures = asyncio.run(check())
+
+    if failures:
+
+        raise SystemExit(f"Queries not using their index: {', '.join(failures)}")
+
+
+if __name__ == '__main__':
+
+    main()
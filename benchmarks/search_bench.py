@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, UTC
+from uuid import uuid4
+
+from benchmarks.auth_bench import configure_environment, git_commit
+
+WORDS = [f'word{index}' for index in range(20000)]
+
+
+def random_text(rng: random.Random, length: int):
+
+    # Zipf-like draw so a few words are common and most are rare, as in real prose
+
+    return ' '.join(WORDS[min(int(rng.paretovariate(1.1)) - 1, len(WORDS) - 1)] for _ in range(length))
+
+
+async def grow_to(size: int, current: int, user_id, rng: random.Random):
+
+    from sqlalchemy import insert
+    from database import async_session
+    from models import Blog
+
+    async with async_session() as db:
+
+        for start in range(current, size, 5000):
+
+            rows = [{'id': uuid4(), 'title': random_text(rng, 6), 'body': random_text(rng, 120), 'user_id': user_id} for _ in range(min(5000, size - start))]
+
+            await db.execute(insert(Blog), rows)
+
+        await db.commit()
+
+
+async def time_query(run_query, repeat: int):
+
+    samples = []
+
+    for _ in range(repeat):
+
+        started = time.perf_counter()
+
+        await run_query()
+
+        samples.append((time.perf_counter() - started) * 1000)
+
+    return round(statistics.median(samples), 3)
+
+
+async def run(args):
+
+    from sqlalchemy import insert, select, or_
+    from database import async_engine, async_session, Base
+    from models import User, Blog
+    from utils.blog_utils import search_blogs
+
+    async with async_engine.begin() as conn:
+
+        await conn.run_sync(Base.metadata.drop_all)
+
+        await conn.run_sync(Base.metadata.create_all)
+
+    user_id = uuid4()
+
+    async with async_session() as db:
+
+        await db.execute(insert(User), [{'id': user_id, 'name': 'search-bench', 'password': '-', 'session_id': uuid4(), 'created_at': datetime.now(UTC).replace(tzinfo=None)}])
+
+        await db.commit()
+
+    rng = random.Random(42)
+
+    results = []
+
+    current = 0
+
+    for size in args.sizes:
+
+        await grow_to(size, current, user_id, rng)
+
+        current = size
+
+        async def indexed():
+
+            async with async_session() as db:
+
+                await search_blogs(query=args.query, db=db, limit=20)
+
+        async def scan():
+
+            # What the endpoint would have to do without an index
+
+            async with async_session() as db:
+
+                pattern = f'%{args.query}%'
+
+                await db.execute(select(Blog.id, Blog.title).where(or_(Blog.title.like(pattern), Blog.body.like(pattern))).limit(20))
+
+        results.append({'blogs': size, 'fts_ms': await time_query(indexed, args.repeat), 'like_scan_ms': await time_query(scan, args.repeat)})
+
+        print(f"{size:>9} blogs  fts {results[-1]['fts_ms']:>9} ms  like-scan {results[-1]['like_scan_ms']:>9} ms", file=sys.stderr)
+
+    await async_engine.dispose()
+
+    return {'meta': {'commit': git_commit(), 'query': args.query, 'repeat': args.repeat}, 'results': results}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Search latency as the blog table grows, FTS index vs LIKE scan')
+
+    parser.add_argument('--sizes', type=lambda value: sorted(int(size) for size in value.split(',')), default=[1000, 10000, 100000])
+
+    parser.add_argument('--query', default='word500', help='A rare word, so the LIKE scan has to read most of the table')
+
+    parser.add_argument('--repeat', type=int, default=7)
+
+    parser.add_argument('--output', default=None)
+
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        configure_environment(f"sqlite+aiosqlite:///{os.path.join(workdir, 'search.db')}")
+
+        report = asyncio.run(run(args))
+
+    payload = json.dumps(report, indent=2)
+
+    if args.output:
+
+        with open(args.output, 'w') as output:
+
+            output.write(payload + '\n')
+
+    else:
+
+        print(payload)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+from benchmarks.auth_bench import configure_environment
+
+# SQL statements each endpoint may emit, by leading keyword; 'token' is a token-only request whose session is already cached,
+# 'stateless' one whose session is not cached but is trusted from the access token (STATELESS_AUTH_ENABLED)
+
+EXPECTED_STATEMENTS = {
+    'token': [],
+    'stateless': [],
+    'login': ['SELECT', 'UPDATE'],
+    'logout': ['SELECT', 'UPDATE'],
+    'create-user': ['INSERT'],
+    'delete-user': ['SELECT', 'DELETE'],
+}
+
+# Requests that must not check out a pooled connection at all, so they skip the pre-ping too
+
+NO_CHECKOUT = ('token', 'stateless')
+
+
+async def count(bench, scenario: str):
+
+    if scenario != 'stateless':
+
+        return await bench.count_statements(scenario)
+
+    import auth.dependencies
+
+    cookie = await bench.cookies_for((await bench.seed_users(1, prefix='stateless'))[0])
+
+    auth.dependencies.STATELESS_AUTH_ENABLED = True
+
+    try:
+
+        return await bench.count_queries(lambda: bench.client.get('/__bench/whoami', headers={'cookie': cookie}))
+
+    finally:
+
+        auth.dependencies.STATELESS_AUTH_ENABLED = False
+
+
+async def check():
+
+    from benchmarks.auth_bench import Bench
+
+    bench = Bench()
+
+    await bench.setup()
+
+    failures = []
+
+    try:
+
+        # Puts the admin session in the user cache, so 'token' and 'create-user' authenticate without a query
+
+        await (await bench.prepare('token', 1))[0]()
+
+        for scenario, expected in EXPECTED_STATEMENTS.items():
+
+            status, statements, checkouts = await count(bench, scenario)
+
+            ok = status < 400 and statements == expected and not (scenario in NO_CHECKOUT and checkouts)
+
+            print(f"{scenario:<12} {'ok' if ok else 'FAIL'}  status={status} statements={statements} expected={expected} checkouts={checkouts}", file=sys.stderr)
+
+            if not ok:
+
+                failures.append(scenario)
+
+    finally:
+
+        await bench.close()
+
+    return failures
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Count the SQL statements and pool checkouts each auth endpoint causes and fail on any change')
+
+    parser.add_argument('--database-url', default=None, help='Defaults to a throwaway SQLite file via aiosqlite')
+
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        configure_environment(args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'statements.db')}")
+
+        failures = asyncio.run(check())
+
+    if failures:
+
+        raise SystemExit(f"Statement counts changed: {', '.join(failures)}")
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+from benchmarks.auth_bench import ROOT, git_commit
+
+if ROOT not in sys.path:
+
+    sys.path.insert(0, ROOT)
+
+from utils.ids import uuid7
+
+GENERATORS = {'uuid4': uuid4, 'uuid7': uuid7}
+
+# How each storage option writes a key: CHAR(32) hex, as SQLAlchemy's Uuid does without a native type, or BINARY(16)
+
+STORAGE = {'char32': lambda value: value.hex, 'binary16': lambda value: value.bytes}
+
+
+def run_case(path: str, generator, encode, rows: int, batch: int, cache_kib: int):
+
+    # WITHOUT ROWID makes the primary key the clustered B-tree, like InnoDB; the page cache is kept small so the
+    # table outgrows it as a production table outgrows the buffer pool
+
+    connection = sqlite3.connect(path, isolation_level=None)
+
+    connection.execute(f'PRAGMA cache_size=-{cache_kib}')
+
+    connection.execute('PRAGMA journal_mode=WAL')
+
+    connection.execute('PRAGMA synchronous=NORMAL')
+
+    connection.execute('CREATE TABLE blogs (id BLOB PRIMARY KEY, user_id BLOB NOT NULL, title TEXT NOT NULL) WITHOUT ROWID')
+
+    connection.execute('CREATE INDEX ix_blogs_user_id_id ON blogs (user_id, id)')
+
+    users = [encode(uuid4()) for _ in range(1000)]
+
+    batches = []
+
+    started = time.perf_counter()
+
+    for offset in range(0, rows, batch):
+
+        values = [(encode(generator()), users[index % len(users)], 'a title of typical length for a blog post') for index in range(offset, min(rows, offset + batch))]
+
+        batch_started = time.perf_counter()
+
+        connection.execute('BEGIN')
+
+        connection.executemany('INSERT INTO blogs (id, user_id, title) VALUES (?, ?, ?)', values)
+
+        connection.execute('COMMIT')
+
+        batches.append(len(values) / (time.perf_counter() - batch_started))
+
+    elapsed = time.perf_counter() - started
+
+    connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+
+    pages = connection.execute('PRAGMA page_count').fetchone()[0]
+
+    connection.close()
+
+    return {
+        'rows_per_s': round(rows / elapsed),
+        'first_batch_rows_per_s': round(batches[0]),
+        'last_batch_rows_per_s': round(batches[-1]),
+        'seconds': round(elapsed, 2),
+        'database_mb': round(pages * page_size / 1024 / 1024, 1),
+    }
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Insert throughput and on-disk size of uuid4 vs uuid7 primary keys')
+
+    parser.add_argument('--rows', type=int, default=2000000)
+
+    parser.add_argument('--batch', type=int, default=50000)
+
+    parser.add_argument('--cache-kib', type=int, default=16384, help='Page cache size; smaller than the final table on purpose')
+
+    parser.add_argument('--output', default=None)
+
+    args = parser.parse_args(argv)
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        for storage, encode in STORAGE.items():
+
+            for name, generator in GENERATORS.items():
+
+                path = os.path.join(workdir, f'{storage}-{name}.db')
+
+                results.append({'generator': name, 'storage': storage, **run_case(path, generator, encode, args.rows, args.batch, args.cache_kib)})
+
+                os.remove(path)
+
+                print(f"{storage:<8} {name}  {results[-1]['rows_per_s']:>8} rows/s  last batch {results[-1]['last_batch_rows_per_s']:>8} rows/s  {results[-1]['database_mb']:>8} MB", file=sys.stderr)
+
+    payload = json.dumps({'meta': {'commit': git_commit(), 'rows': args.rows, 'batch': args.batch, 'cache_kib': args.cache_kib}, 'results': results}, indent=2)
+
+    if args.output:
+
+        with open(args.output, 'w') as output:
+
+            output.write(payload + '\n')
+
+    else:
+
+        print(payload)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -1,26 +1,214 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from fastapi import HTTPException, Depends
+from bisect import bisect_left
+from itertools import cycle
+from utils.cache import TTLCache
+from utils.metrics import METRICS_ENABLED, DB_QUERY_SECONDS, DB_POOL_CHECKOUT_WAIT_SECONDS, DB_POOL_TIMEOUTS, DB_POOL_CONNECTIONS, register_collector
+import logging
+import time
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv('DATABASE_URL')
 
-async_engine = create_async_engine(DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+pool_options = {
+    'pool_size': DB_POOL_SIZE,
+    'max_overflow': DB_MAX_OVERFLOW,
+    'pool_recycle': DB_POOL_RECYCLE,
+    'pool_pre_ping': DB_POOL_PRE_PING,
+    'pool_timeout': DB_POOL_TIMEOUT,
+}
+
+async_engine = create_async_engine(DATABASE_URL, **pool_options)
+
+replica_engines = [create_async_engine(url, **pool_options) for url in DATABASE_REPLICA_URLS]
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless every connection turns them on
+
+    cursor = dbapi_connection.cursor()
+
+    cursor.execute('PRAGMA foreign_keys=ON')
+
+    cursor.close()
+
+
+STATEMENT_TYPES = ('select', 'insert', 'update', 'delete')
+
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+
+    context._metrics_started = time.perf_counter()
+
+
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+
+    kind = statement.lstrip()[:6].lower()
+
+    DB_QUERY_SECONDS.observe(time.perf_counter() - context._metrics_started, kind if kind in STATEMENT_TYPES else 'other')
+
+
+for engine in (async_engine, *replica_engines):
+
+    if engine.dialect.name == 'sqlite':
+
+        event.listen(engine.sync_engine, 'connect', _enable_sqlite_foreign_keys)
+
+    if METRICS_ENABLED:
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', _statement_started)
+
+        event.listen(engine.sync_engine, 'after_cursor_execute', _statement_finished)
 
-async_session = sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, autocommit=False)
+# Values written by the app are already known, so skip the reload that expire-on-commit would trigger on next access
+
+async_session = sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, autocommit=False, expire_on_commit=False)
+
+replica_sessions = [sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, autocommit=False, expire_on_commit=False) for engine in replica_engines]
+
+_replica_cycle = cycle(replica_sessions)
+
+# Keys written on this worker within REPLICA_PIN_SECONDS read from the primary so replication lag cannot hide the write
+
+primary_pins = TTLCache(maxsize=100000, ttl=REPLICA_PIN_SECONDS)
+
+
+def read_session():
+
+    # Round-robin over replicas; falls back to the primary when none are configured
+
+    return next(_replica_cycle)() if replica_sessions else async_session()
+
+
+def pin_to_primary(key):
+
+    primary_pins.set(key, True)
+
+
+def is_pinned(key):
+
+    return primary_pins.get(key) is not None
+
+
+async def dispose_engines():
+
+    await async_engine.dispose()
+
+    for engine in replica_engines:
+
+        await engine.dispose()
 
 Base = declarative_base()
 
-async def get_db():
 
-    db = None
+class PoolStats:
 
-    try:
+    # Upper bounds in seconds for the checkout wait histogram; the last bucket is +Inf
+
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+
+        self.wait_counts = [0] * (len(self.buckets) + 1)
+
+        self.wait_sum = 0.0
+
+        self.checkouts = 0
+
+        self.timeouts = 0
+
+    def observe_wait(self, seconds: float):
+
+        self.wait_counts[bisect_left(self.buckets, seconds)] += 1
+
+        self.wait_sum += seconds
+
+        self.checkouts += 1
+
+        DB_POOL_CHECKOUT_WAIT_SECONDS.observe(seconds)
 
-        db = async_session()
+    def snapshot(self):
+
+        pool = async_engine.sync_engine.pool
+
+        histogram = {str(bound): count for bound, count in zip(self.buckets, self.wait_counts)}
+
+        histogram['+Inf'] = self.wait_counts[-1]
+
+        return {
+            'pool_size': pool.size() if hasattr(pool, 'size') else None,
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'checked_in': pool.checkedin() if hasattr(pool, 'checkedin') else None,
+            'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'checkout_wait_seconds_sum': self.wait_sum,
+            'checkout_wait_seconds': histogram,
+        }
+
+
+pool_stats = PoolStats()
+
+
+def _collect_pool_connections():
+
+    snapshot = pool_stats.snapshot()
+
+    for state in ('pool_size', 'checked_out', 'checked_in', 'overflow'):
+
+        # QueuePool counts overflow from -pool_size until the pool is full, so clamp it to connections actually in overflow
+
+        if snapshot[state] is not None:
+
+            DB_POOL_CONNECTIONS.set(max(snapshot[state], 0), state)
+
+
+register_collector(_collect_pool_connections)
+
+
+def pool_busy():
+
+    pool_stats.timeouts += 1
+
+    DB_POOL_TIMEOUTS.inc()
+
+    logger.error(f'Timed out after {DB_POOL_TIMEOUT}s waiting for a database connection')
+
+    return HTTPException(status_code=503, detail='Database busy, please retry', headers={'Retry-After': '1'})
+
+
+async def get_db_lazy():
+
+    # The request's primary session without a connection; one is checked out only if a query runs.
+    # For dependencies such as authentication that usually answer from the token or a cache
+
+    db = async_session()
+
+    try:
 
         yield db
 
@@ -28,3 +216,64 @@ async def get_db():
 
         await db.close()
 
+
+async def check_out(db: AsyncSession):
+
+    # Check out eagerly so pool exhaustion surfaces here as a 503 instead of deep inside a handler
+
+    if db.in_transaction():
+
+        return
+
+    started = time.perf_counter()
+
+    try:
+
+        await db.connection()
+
+    except PoolTimeoutError:
+
+        raise pool_busy()
+
+    # pool_stats describes the primary pool, so replica waits are left out of it
+
+    if db.bind is async_engine:
+
+        pool_stats.observe_wait(time.perf_counter() - started)
+
+
+async def get_db(db: AsyncSession = Depends(get_db_lazy)):
+
+    await check_out(db)
+
+    return db
+
+
+async def get_read_db_lazy(db: AsyncSession = Depends(get_db_lazy)):
+
+    # Without replicas, reads share the request's primary session instead of checking out a second connection
+
+    if not replica_sessions:
+
+        yield db
+
+        return
+
+    read_db = read_session()
+
+    try:
+
+        yield read_db
+
+    finally:
+
+        await read_db.close()
+
+
+async def get_read_db(read_db: AsyncSession = Depends(get_read_db_lazy)):
+
+    # Checks out only the read session, so the primary is touched here only when there are no replicas
+
+    await check_out(read_db)
+
+    return read_db
@@ -1,8 +1,20 @@
 from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
+import argparse
 import logging
 import uvicorn
-from routers import user_router
+from routers import user_router, blog_router, internal_router
+from utils.timing import ServerTimingMiddleware, SERVER_TIMING_ENABLED
+from utils.compression import CompressionMiddleware, COMPRESSION_ENABLED
+from database import dispose_engines
+from auth.security import shutdown_pool
+from auth.activity import activity_buffer, ACTIVITY_TRACKING_ENABLED
+from utils.warmup import warm_up, mark_not_ready, install_drain_handler
+from utils.metrics import MetricsMiddleware, metrics_exporter, METRICS_ENABLED
+import asyncio
 import os
+import tempfile
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -12,10 +24,63 @@ ssl_certfile = os.path.join(current_dir, "certs", "cert.pem")
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    # Warms connections, compiled statements and crypto in the background; /internal/ready answers 503 until it is done
+
+    warmup_task = asyncio.create_task(warm_up())
+
+    # SIGTERM first turns /internal/ready to 503 and only then lets uvicorn stop accepting and drain
+
+    install_drain_handler()
+
+    if ACTIVITY_TRACKING_ENABLED:
+
+        activity_buffer.start()
+
+    metrics_exporter.start()
+
+    yield
+
+    # Runs after uvicorn has drained in-flight requests; already not ready if the shutdown came through SIGTERM
+
+    mark_not_ready()
+
+    warmup_task.cancel()
+
+    await asyncio.gather(warmup_task, return_exceptions=True)
+
+    await activity_buffer.stop()
+
+    metrics_exporter.stop()
+
+    await dispose_engines()
+
+    shutdown_pool(wait=False)
+
+app = FastAPI(lifespan=lifespan)
+
+if COMPRESSION_ENABLED:
+
+    app.add_middleware(CompressionMiddleware)
+
+if SERVER_TIMING_ENABLED:
+
+    app.add_middleware(ServerTimingMiddleware)
+
+# Outermost, so the latency it records includes compression and every other middleware
+
+if METRICS_ENABLED:
+
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(user_router.router)
 
+app.include_router(blog_router.router)
+
+app.include_router(internal_router.router)
+
 @app.get('/')
 async def root():
 
@@ -30,6 +95,71 @@ async def root():
         raise HTTPException(status_code=500, detail='Internal Server Error')
 
 
+def env_flag(name: str, default: str = 'false'):
+
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description='Run the API server')
+
+    parser.add_argument('--mode', choices=['dev', 'prod'], default=os.getenv('SERVER_MODE', 'dev'))
+
+    parser.add_argument('--host', default=os.getenv('SERVER_HOST', '0.0.0.0'))
+
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERVER_PORT', 8000)))
+
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1)))
+
+    parser.add_argument('--keep-alive', type=int, default=int(os.getenv('SERVER_KEEP_ALIVE', 5)), help='Seconds to keep idle connections open')
+
+    parser.add_argument('--backlog', type=int, default=int(os.getenv('SERVER_BACKLOG', 2048)))
+
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30)), help='Seconds to drain in-flight requests on shutdown')
+
+    parser.add_argument('--behind-proxy', action='store_true', default=env_flag('BEHIND_PROXY'), help='Serve plain HTTP and trust X-Forwarded-* from a TLS-terminating proxy')
+
+    parser.add_argument('--access-log', action='store_true', default=env_flag('SERVER_ACCESS_LOG'))
+
+    parser.add_argument('--forwarded-allow-ips', default=os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1'))
+
+    return parser.parse_args()
+
+def run_production(args):
+
+    tls = {} if args.behind_proxy else {'ssl_keyfile': ssl_keyfile, 'ssl_certfile': ssl_certfile}
+
+    # Workers inherit the environment, so they all publish metric snapshots to the same directory
+
+    if args.workers > 1 and not os.getenv('METRICS_MULTIPROCESS_DIR'):
+
+        os.environ['METRICS_MULTIPROCESS_DIR'] = tempfile.mkdtemp(prefix='metrics-')
+
+    uvicorn.run(
+        app='main:app',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop='uvloop' if find_spec('uvloop') else 'auto',
+        http='httptools' if find_spec('httptools') else 'auto',
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=args.behind_proxy,
+        forwarded_allow_ips=args.forwarded_allow_ips if args.behind_proxy else None,
+        access_log=args.access_log,
+        **tls,
+    )
+
+
 if __name__ == '__main__':
 
-    uvicorn.run(app='main:app', host='0.0.0.0', port=8000, reload=True, ssl_keyfile=ssl_keyfile, ssl_certfile=ssl_certfile)
\ No newline at end of file
+    args = parse_args()
+
+    if args.mode == 'prod':
+
+        run_production(args)
+
+    else:
+
+        uvicorn.run(app='main:app', host=args.host, port=args.port, reload=True, ssl_keyfile=ssl_keyfile, ssl_certfile=ssl_certfile)
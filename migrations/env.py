@@ -0,0 +1,85 @@
+from logging.config import fileConfig
+from alembic import context
+from database import Base, DATABASE_URL, async_engine
+import asyncio
+import sqlalchemy as sa
+from utils.ids import BinaryUUID
+import models  # noqa: F401  registers the tables on Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+
+    # The SQLite FTS5 table and its shadow tables are managed by hand in the migrations
+
+    if type_ == 'table' and name.startswith('blogs_fts'):
+
+        return False
+
+    if type_ == 'index' and name == 'ft_blogs_title_body':
+
+        return context.get_context().dialect.name == 'mysql'
+
+    return True
+
+
+def compare_type(migration_context, inspected_column, metadata_column, inspected_type, metadata_type):
+
+    # SQLite has no UUID or BINARY type and reflects both as NUMERIC; elsewhere BinaryUUID is reflected as its BINARY(16)
+
+    if isinstance(metadata_type, BinaryUUID):
+
+        return migration_context.dialect.name != 'sqlite' and not isinstance(inspected_type, (sa.BINARY, sa.LargeBinary))
+
+    if migration_context.dialect.name == 'sqlite' and isinstance(metadata_type, sa.Uuid):
+
+        return False
+
+    return None
+
+
+def run_migrations_offline():
+
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True, include_object=include_object, compare_type=compare_type, render_as_batch=DATABASE_URL.startswith('sqlite'))
+
+    with context.begin_transaction():
+
+        context.run_migrations()
+
+
+def do_run_migrations(connection):
+
+    # SQLite cannot ALTER constraints, so batch mode rebuilds the table instead
+
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object, compare_type=compare_type, render_as_batch=connection.dialect.name == 'sqlite')
+
+    with context.begin_transaction():
+
+        context.run_migrations()
+
+
+async def run_migrations_online():
+
+    # The app's engine, so migrations see the same connect-time settings (e.g. SQLite foreign keys)
+
+    async with async_engine.connect() as connection:
+
+        await connection.run_sync(do_run_migrations)
+
+    await async_engine.dispose()
+
+
+if context.is_offline_mode():
+
+    run_migrations_offline()
+
+else:
+
+    asyncio.run(run_migrations_online())
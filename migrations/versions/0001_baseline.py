@@ -0,0 +1,54 @@
+"""Baseline: users and blogs as first deployed
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+
+Databases created before migrations existed already match this revision: run `alembic stamp 0001_baseline`, then `alembic upgrade head`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+
+    op.create_table(
+        'users',
+        sa.Column('id', sa.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(60), nullable=False),
+        sa.Column('password', sa.String(255), nullable=False),
+        sa.Column('session_id', sa.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('created_by', sa.UUID(as_uuid=True), nullable=True),
+        sa.PrimaryKeyConstraint('id', name='pk_user_id'),
+        sa.UniqueConstraint('name'),
+    )
+
+    op.create_index('ix_users_id', 'users', ['id'])
+
+    op.create_table(
+        'blogs',
+        sa.Column('id', sa.UUID(as_uuid=True), nullable=False),
+        sa.Column('title', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.UUID(as_uuid=True), nullable=False),
+        sa.PrimaryKeyConstraint('id', name='pk_blogs_id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_blog_users_id'),
+    )
+
+    op.create_index('ix_blogs_id', 'blogs', ['id'])
+
+    op.create_index('ix_blogs_user_id', 'blogs', ['user_id'])
+
+
+def downgrade():
+
+    op.drop_table('blogs')
+
+    op.drop_table('users')
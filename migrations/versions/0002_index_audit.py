@@ -0,0 +1,76 @@
+"""Index audit: drop indexes duplicating the primary keys, add the composite and full-text indexes
+
+Revision ID: 0002_index_audit
+Revises: 0001_baseline
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = '0002_index_audit'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ai AFTER INSERT ON blogs BEGIN INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ad AFTER DELETE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_au AFTER UPDATE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+)
+
+
+def upgrade():
+
+    # Primary keys are already unique B-trees; the extra indexes only cost writes
+
+    op.drop_index('ix_users_id', table_name='users')
+
+    op.drop_index('ix_blogs_id', table_name='blogs')
+
+    # Keyset pagination of a user's blogs; its user_id prefix also serves plain user_id lookups and the foreign key,
+    # so it is created before the single-column index goes (MySQL refuses to leave the FK without an index)
+
+    op.create_index('ix_blogs_user_id_id', 'blogs', ['user_id', 'id'])
+
+    op.drop_index('ix_blogs_user_id', table_name='blogs')
+
+    dialect = op.get_context().dialect.name
+
+    if dialect == 'mysql':
+
+        op.create_index('ft_blogs_title_body', 'blogs', ['title', 'body'], mysql_prefix='FULLTEXT')
+
+    if dialect == 'sqlite':
+
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS blogs_fts USING fts5(title, body, content='blogs', content_rowid='rowid')")
+
+        for statement in FTS_TRIGGERS:
+
+            op.execute(statement)
+
+        op.execute("INSERT INTO blogs_fts (blogs_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+
+    dialect = op.get_context().dialect.name
+
+    if dialect == 'sqlite':
+
+        for name in ('blogs_fts_ai', 'blogs_fts_ad', 'blogs_fts_au'):
+
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+        op.execute('DROP TABLE IF EXISTS blogs_fts')
+
+    if dialect == 'mysql':
+
+        op.drop_index('ft_blogs_title_body', table_name='blogs')
+
+    op.create_index('ix_blogs_user_id', 'blogs', ['user_id'])
+
+    op.drop_index('ix_blogs_user_id_id', table_name='blogs')
+
+    op.create_index('ix_blogs_id', 'blogs', ['id'])
+
+    op.create_index('ix_users_id', 'users', ['id'])
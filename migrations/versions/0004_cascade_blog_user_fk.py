@@ -0,0 +1,67 @@
+"""Cascade user deletes to their blogs in the database
+
+Revision ID: 0004_cascade_blog_user_fk
+Revises: 0003_blog_version
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004_cascade_blog_user_fk'
+down_revision = '0003_blog_version'
+branch_labels = None
+depends_on = None
+
+FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ai AFTER INSERT ON blogs BEGIN INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ad AFTER DELETE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_au AFTER UPDATE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+)
+
+
+def blogs_table(ondelete):
+
+    # SQLite reflection loses the UUID types and constraint names, so batch mode copies from this definition
+
+    return sa.Table(
+        'blogs',
+        sa.MetaData(),
+        sa.Column('id', sa.UUID(as_uuid=True), nullable=False),
+        sa.Column('title', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.UUID(as_uuid=True), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+        sa.PrimaryKeyConstraint('id', name='pk_blogs_id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_blog_users_id', ondelete=ondelete),
+        sa.Index('ix_blogs_user_id_id', 'user_id', 'id'),
+    )
+
+
+def replace_foreign_key(ondelete, previous):
+
+    with op.batch_alter_table('blogs', copy_from=blogs_table(previous)) as batch:
+
+        batch.drop_constraint('fk_blog_users_id', type_='foreignkey')
+
+        batch.create_foreign_key('fk_blog_users_id', 'users', ['user_id'], ['id'], ondelete=ondelete)
+
+    if op.get_context().dialect.name == 'sqlite':
+
+        # Batch mode rebuilt blogs: its triggers went with the old table and rowids may have changed
+
+        for statement in FTS_TRIGGERS:
+
+            op.execute(statement)
+
+        op.execute("INSERT INTO blogs_fts (blogs_fts) VALUES ('rebuild')")
+
+
+def upgrade():
+
+    replace_foreign_key('CASCADE', previous=None)
+
+
+def downgrade():
+
+    replace_foreign_key(None, previous='CASCADE')
@@ -0,0 +1,24 @@
+"""Users' last_seen_at, written behind by auth.activity
+
+Revision ID: 0005_user_last_seen_at
+Revises: 0004_cascade_blog_user_fk
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005_user_last_seen_at'
+down_revision = '0004_cascade_blog_user_fk'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+
+    op.add_column('users', sa.Column('last_seen_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+
+    op.drop_column('users', 'last_seen_at')
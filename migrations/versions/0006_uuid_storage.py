@@ -0,0 +1,246 @@
+"""Store the UUID columns as UUID_STORAGE asks, converting the existing values
+
+Revision ID: 0006_uuid_storage
+Revises: 0005_user_last_seen_at
+Create Date: 2026-10-18
+
+Revisions up to 0005 create native UUID columns. With UUID_STORAGE=binary this revision rewrites every UUID
+column as BINARY(16) and converts the stored ids; with the default native storage it changes nothing.
+Downgrading converts back to native columns, so to switch an existing database later, downgrade to
+0005_user_last_seen_at, change UUID_STORAGE and upgrade again.
+
+"""
+from alembic import op, context
+import sqlalchemy as sa
+from utils.ids import BinaryUUID, UUID_STORAGE
+
+revision = '0006_uuid_storage'
+down_revision = '0005_user_last_seen_at'
+branch_labels = None
+depends_on = None
+
+UUID_COLUMNS = {'users': ('id', 'session_id', 'created_by'), 'blogs': ('id', 'user_id')}
+
+NULLABLE = {'created_by'}
+
+COPY_BATCH_SIZE = 5000
+
+FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ai AFTER INSERT ON blogs BEGIN INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ad AFTER DELETE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_au AFTER UPDATE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+)
+
+
+def native():
+
+    return sa.UUID(as_uuid=True)
+
+
+def stored_as_binary():
+
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'sqlite':
+
+        # SQLite reflects both types as NUMERIC; the declared type is still in the schema
+
+        declared = {row[1]: row[2] for row in bind.exec_driver_sql('PRAGMA table_info(users)')}
+
+        return declared['id'].upper().startswith('BINARY')
+
+    column = next(column for column in sa.inspect(bind).get_columns('users') if column['name'] == 'id')
+
+    return isinstance(column['type'], (sa.BINARY, sa.VARBINARY, sa.LargeBinary))
+
+
+def users_table(name, id_type):
+
+    return sa.Table(
+        name,
+        sa.MetaData(),
+        sa.Column('id', id_type, nullable=False),
+        sa.Column('name', sa.String(60), nullable=False),
+        sa.Column('password', sa.String(255), nullable=False),
+        sa.Column('session_id', id_type, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('created_by', id_type, nullable=True),
+        sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id', name='pk_user_id'),
+        sa.UniqueConstraint('name'),
+    )
+
+
+def blogs_table(name, id_type, foreign_key):
+
+    metadata = sa.MetaData()
+
+    # Only so the foreign key can resolve its target when the table is created
+
+    sa.Table('users', metadata, sa.Column('id', id_type, primary_key=True))
+
+    return sa.Table(
+        name,
+        metadata,
+        sa.Column('id', id_type, nullable=False),
+        sa.Column('title', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('user_id', id_type, nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+        sa.PrimaryKeyConstraint('id', name='pk_blogs_id'),
+        *([sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_blog_users_id', ondelete='CASCADE')] if foreign_key else []),
+    )
+
+
+def copy_values(table, source_type, target_type):
+
+    # Read with the old type and write with the new one, so the driver does the conversion on every dialect
+
+    bind = op.get_bind()
+
+    columns = UUID_COLUMNS[table]
+
+    source = sa.table(table, *(sa.column(name, source_type) for name in columns))
+
+    target = sa.table(table, sa.column('id', source_type), *(sa.column(f'{name}_new', target_type) for name in columns))
+
+    update = sa.update(target).where(target.c.id == sa.bindparam('old_id')).values({f'{name}_new': sa.bindparam(f'value_{name}') for name in columns})
+
+    last_id = None
+
+    while True:
+
+        statement = sa.select(*source.c).order_by(source.c.id).limit(COPY_BATCH_SIZE)
+
+        if last_id is not None:
+
+            statement = statement.where(source.c.id > last_id)
+
+        rows = bind.execute(statement).all()
+
+        if not rows:
+
+            return
+
+        bind.execute(update, [{'old_id': row.id, **{f'value_{name}': getattr(row, name) for name in columns}} for row in rows])
+
+        last_id = rows[-1].id
+
+
+def rebuild_sqlite(final, select_list):
+
+    # Create under a temporary name, copy keeping rowids (the FTS index refers to them), then swap in
+
+    bind = op.get_bind()
+
+    name = final.name
+
+    final.name = f'_uuid_storage_{name}'
+
+    final.create(bind)
+
+    columns = ', '.join(column.name for column in final.columns)
+
+    op.execute(f'INSERT INTO {final.name} (rowid, {columns}) SELECT rowid, {select_list} FROM {name}')
+
+    op.execute(f'DROP TABLE {name}')
+
+    op.execute(f'ALTER TABLE {final.name} RENAME TO {name}')
+
+
+def convert_sqlite(target_type):
+
+    # Dropping users while blogs references it would cascade-delete every blog, so blogs loses its foreign key
+    # for the users rebuild and gets it back afterwards
+
+    op.drop_index('ix_blogs_user_id_id', table_name='blogs')
+
+    rebuild_sqlite(blogs_table('blogs', target_type, foreign_key=False), 'id_new, title, body, user_id_new, version')
+
+    rebuild_sqlite(users_table('users', target_type), 'id_new, name, password, session_id_new, created_at, created_by_new, last_seen_at')
+
+    rebuild_sqlite(blogs_table('blogs', target_type, foreign_key=True), 'id, title, body, user_id, version')
+
+    op.create_index('ix_blogs_user_id_id', 'blogs', ['user_id', 'id'])
+
+    for statement in FTS_TRIGGERS:
+
+        op.execute(statement)
+
+    op.execute("INSERT INTO blogs_fts (blogs_fts) VALUES ('rebuild')")
+
+
+def convert_in_place(target_type):
+
+    op.drop_constraint('fk_blog_users_id', 'blogs', type_='foreignkey')
+
+    op.drop_index('ix_blogs_user_id_id', table_name='blogs')
+
+    op.drop_constraint('pk_blogs_id', 'blogs', type_='primary')
+
+    op.drop_constraint('pk_user_id', 'users', type_='primary')
+
+    for table, columns in UUID_COLUMNS.items():
+
+        for name in columns:
+
+            op.drop_column(table, name)
+
+            op.alter_column(table, f'{name}_new', new_column_name=name, existing_type=target_type, nullable=name in NULLABLE)
+
+    op.create_primary_key('pk_user_id', 'users', ['id'])
+
+    op.create_primary_key('pk_blogs_id', 'blogs', ['id'])
+
+    op.create_index('ix_blogs_user_id_id', 'blogs', ['user_id', 'id'])
+
+    op.create_foreign_key('fk_blog_users_id', 'blogs', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def convert(source_type, target_type):
+
+    for table, columns in UUID_COLUMNS.items():
+
+        for name in columns:
+
+            op.add_column(table, sa.Column(f'{name}_new', target_type, nullable=True))
+
+        copy_values(table, source_type, target_type)
+
+    if op.get_bind().dialect.name == 'sqlite':
+
+        convert_sqlite(target_type)
+
+    else:
+
+        convert_in_place(target_type)
+
+
+def upgrade():
+
+    if UUID_STORAGE != 'binary':
+
+        return
+
+    if context.is_offline_mode():
+
+        raise RuntimeError('Converting UUID columns to BINARY(16) copies every id and needs a live database connection')
+
+    if not stored_as_binary():
+
+        convert(native(), BinaryUUID())
+
+
+def downgrade():
+
+    if context.is_offline_mode():
+
+        if UUID_STORAGE == 'binary':
+
+            raise RuntimeError('Converting UUID columns back from BINARY(16) copies every id and needs a live database connection')
+
+        return
+
+    if stored_as_binary():
+
+        convert(BinaryUUID(), native())
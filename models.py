@@ -1,21 +1,27 @@
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from database import Base
-from sqlalchemy import Column, String, UUID, DateTime, PrimaryKeyConstraint, Text, ForeignKeyConstraint
+from sqlalchemy import Column, String, DateTime, Integer, PrimaryKeyConstraint, Text, ForeignKeyConstraint, Index, DDL, event
 from uuid import uuid4
+from utils.ids import uuid7, UUIDType
 from utils.time_setting import get_current_ist_time
 
 class User(Base):
 
     __tablename__ = 'users'
 
-    id = Column(UUID(as_uuid=True), default=uuid4, index=True)
+    # Time-ordered keys: inserts append to the primary-key B-tree instead of splitting random pages
+    id = Column(UUIDType(), default=uuid7)
     name = Column(String(60), nullable=False, unique=True)
     password = Column(String(255), nullable=False)
-    session_id = Column(UUID(as_uuid=True), nullable=False, default=uuid4)
+    # Not indexed, so ordering buys nothing; stays fully random so it cannot be guessed from a login time
+    session_id = Column(UUIDType(), nullable=False, default=uuid4)
     created_at = Column(DateTime, nullable=True, default=get_current_ist_time)
-    created_by = Column(UUID(as_uuid=True), nullable=True)
+    created_by = Column(UUIDType(), nullable=True)
+    # Written in batches by auth.activity, so it lags real activity by up to ACTIVITY_FLUSH_SECONDS
+    last_seen_at = Column(DateTime, nullable=True)
 
-    content = relationship('Blog', back_populates='creator')
+    # Blogs are removed by the FK's ON DELETE CASCADE; the ORM never loads them to delete a user
+    content = relationship('Blog', back_populates='creator', passive_deletes=True)
 
     __table_args__ = (
         PrimaryKeyConstraint('id', name='pk_user_id'),
@@ -25,14 +31,37 @@ class Blog(Base):
 
     __tablename__ = 'blogs'
 
-    id = Column(UUID(as_uuid=True), default=uuid4, index=True)
+    id = Column(UUIDType(), default=uuid7)
     title = Column(Text, nullable=False)
-    body = Column(Text, nullable=False)
-    user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    # Large; loaded only when a detail view asks for it with undefer()
+    body = deferred(Column(Text, nullable=False))
+    user_id = Column(UUIDType(), nullable=False)
+    # Bumped by the ORM on every update; the blog's ETag is derived from it
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     creator = relationship('User', back_populates='content')
 
     __table_args__ = (
         PrimaryKeyConstraint('id', name='pk_blogs_id'),
-        ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_blog_users_id')
-    )
\ No newline at end of file
+        ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_blog_users_id', ondelete='CASCADE'),
+        # Backs keyset pagination of a user's blogs and also serves plain user_id lookups
+        Index('ix_blogs_user_id_id', 'user_id', 'id'),
+        # Full-text search; MySQL only, SQLite gets the FTS5 table below
+        Index('ft_blogs_title_body', 'title', 'body', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+    __mapper_args__ = {'version_id_col': version}
+
+
+# External-content FTS5 index kept in sync by triggers; after a VACUUM run INSERT INTO blogs_fts(blogs_fts) VALUES ('rebuild')
+
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS blogs_fts USING fts5(title, body, content='blogs', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ai AFTER INSERT ON blogs BEGIN INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_ad AFTER DELETE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS blogs_fts_au AFTER UPDATE ON blogs BEGIN INSERT INTO blogs_fts (blogs_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body); INSERT INTO blogs_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body); END",
+):
+
+    event.listen(Blog.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+event.listen(Blog.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS blogs_fts').execute_if(dialect='sqlite'))
\ No newline at end of file
@@ -0,0 +1,183 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from schemas import CreateBlogRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_db_lazy, get_read_db
+from utils.blog_utils import create_new_blog, get_blogs_page, get_blog_by_id, get_blog_version, delete_blog, stream_user_blogs, search_blogs, MAX_PAGE_SIZE
+from utils.http_cache import cache_control, blog_etag, matching_etag
+from auth.dependencies import get_user
+from typing import Optional
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix='/blogs', tags=['Blog'])
+
+@router.post('')
+async def create_blog(request: CreateBlogRequest, response: Response, db: AsyncSession = Depends(get_db), user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        blog = await create_new_blog(request=request, db=db, current_user=user)
+
+        response.status_code = 201
+
+        response.headers['ETag'] = blog_etag(UUID(blog['id']), blog['version'])
+
+        return blog
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Create Blog Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+@router.get('')
+async def list_blogs(response: Response, user_id: Optional[UUID] = None, cursor: Optional[str] = None, limit: int = Query(default=20, ge=1, le=MAX_PAGE_SIZE), read_db: AsyncSession = Depends(get_read_db), user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        response.headers['Cache-Control'] = cache_control('blog_list')
+
+        return await get_blogs_page(user_id=user_id or user.id, db=read_db, limit=limit, cursor=cursor)
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in List Blogs Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+@router.get('/export')
+async def export_blogs(response: Response, user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        return StreamingResponse(stream_user_blogs(user_id=user.id), media_type='application/x-ndjson')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Export Blogs Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+@router.get('/search')
+async def search(response: Response, q: str = Query(min_length=1, max_length=200), page: int = Query(default=1, ge=1, le=100), limit: int = Query(default=20, ge=1, le=MAX_PAGE_SIZE), read_db: AsyncSession = Depends(get_read_db), user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        response.headers['Cache-Control'] = cache_control('blog_search')
+
+        return await search_blogs(query=q, db=read_db, limit=limit, page=page)
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Search Blogs Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+@router.get('/{blog_id}')
+async def get_blog(blog_id: UUID, response: Response, if_none_match: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_db_lazy), read_db: AsyncSession = Depends(get_read_db), user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        if if_none_match:
+
+            version = await get_blog_version(blog_id=blog_id, db=db, read_db=read_db)
+
+            etag = matching_etag(if_none_match, blog_etag(blog_id, version)) if version is not None else None
+
+            if etag:
+
+                # A 304 has no body for the compression middleware to see, so the ETag keeps the form of the client's cached 200
+
+                return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': cache_control('blog_detail')})
+
+        blog = await get_blog_by_id(blog_id=blog_id, db=db, read_db=read_db)
+
+        response.headers['ETag'] = blog_etag(blog_id, blog['version'])
+
+        response.headers['Cache-Control'] = cache_control('blog_detail')
+
+        return blog
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Get Blog Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+@router.delete('/{blog_id}')
+async def remove_blog(blog_id: UUID, response: Response, db: AsyncSession = Depends(get_db), user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        await delete_blog(blog_id=blog_id, db=db, current_user=user)
+
+        return {'message': 'Blog deleted'}
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Delete Blog Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
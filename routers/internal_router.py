@@ -0,0 +1,97 @@
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import PlainTextResponse
+from database import pool_stats
+from utils.compression import compressed_cache
+from auth.activity import activity_buffer
+from auth.dependencies import user_cache
+from utils.warmup import is_ready, is_draining
+from utils.metrics import render, METRICS_ENABLED
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix='/internal', tags=['Internal'], include_in_schema=False)
+
+@router.get('/ready')
+async def readiness(response: Response):
+
+    if is_ready():
+
+        return {'status': 'ready'}
+
+    response.status_code = 503
+
+    return {'status': 'shutting down' if is_draining() else 'warming up'}
+
+@router.get('/pool-stats')
+async def get_pool_stats():
+
+    try:
+
+        return pool_stats.snapshot()
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Pool Stats Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+@router.get('/compression-stats')
+async def get_compression_stats():
+
+    try:
+
+        return compressed_cache.stats()
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Compression Stats Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+@router.get('/user-cache-stats')
+async def get_user_cache_stats():
+
+    try:
+
+        return user_cache.stats()
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in User Cache Stats Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+@router.get('/activity-stats')
+async def get_activity_stats():
+
+    try:
+
+        return activity_buffer.stats()
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Activity Stats Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+@router.get('/metrics')
+async def get_metrics():
+
+    if not METRICS_ENABLED:
+
+        raise HTTPException(status_code=404, detail='Metrics are disabled')
+
+    try:
+
+        return PlainTextResponse(render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Metrics Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
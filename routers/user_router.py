@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, Response, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
-from schemas import LoginUserRequest, CreateUserRequest, DeleteUserRequest
+from schemas import LoginUserRequest, CreateUserRequest, BulkCreateUserRequest, DeleteUserRequest
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
-from utils.user_utils import user_login, user_logout, create_new_user, delete_current_user
+from database import get_db, get_read_db
+from utils.user_utils import user_login, user_logout, create_new_user, create_new_users_bulk, delete_current_user
 import logging
 from utils.time_setting import get_access_cookie_expire, get_refresh_cookie_expire
 from auth.dependencies import get_user
 from auth.dependencies import clear_cookie
+from auth.throttle import check_login_allowed
 from models import User
 
 logger = logging.getLogger(__name__)
@@ -15,11 +16,13 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=['User'])
 
 @router.post('/login')
-async def login(request: LoginUserRequest, response: Response, db: AsyncSession = Depends(get_db)):
+async def login(request: LoginUserRequest, response: Response, http_request: Request, db: AsyncSession = Depends(get_db), read_db: AsyncSession = Depends(get_read_db)):
 
     try:
 
-        access_token, refresh_token = await user_login(request=request, db=db)
+        await check_login_allowed(name=request.name, client_ip=http_request.client.host if http_request.client else 'unknown')
+
+        access_token, refresh_token = await user_login(request=request, db=db, read_db=read_db)
 
         if not access_token:
 
@@ -118,8 +121,35 @@ async def create_user(request: CreateUserRequest, response: Response, db: AsyncS
 
         raise HTTPException(status_code=500, detail='Internal Server Error')
 
+@router.post('/create-users')
+async def create_users(request: BulkCreateUserRequest, response: Response, db: AsyncSession = Depends(get_db), user = Depends(get_user)):
+
+    try:
+
+        if isinstance(user, JSONResponse):
+
+            response.status_code = 401
+
+            return {'message': 'Unauthorized to access this endpoint'}
+
+        results = await create_new_users_bulk(requests=request.users, db=db, current_user=user)
+
+        created = sum(1 for result in results if result['status'] == 'created')
+
+        return {'message': f'{created} of {len(results)} users created', 'results': results}
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown Error in Bulk Create Users Endpoint {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
 @router.delete('/delete-user')
-async def delete_user(response: Response, db: AsyncSession = Depends(get_db), user = Depends(get_user)):
+async def delete_user(response: Response, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db), user = Depends(get_user)):
 
     try:
 
@@ -129,7 +159,7 @@ async def delete_user(response: Response, db: AsyncSession = Depends(get_db), us
 
             return {'message': 'Unauthorized to access this endpoint'}
 
-        status = await delete_current_user(current_user=user, db=db)
+        status = await delete_current_user(current_user=user, db=db, background_tasks=background_tasks)
 
         if status:
 
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
 
 class LoginUserRequest(BaseModel):
 
@@ -10,6 +11,15 @@ class CreateUserRequest(BaseModel):
     name: str
     password: str
 
+class BulkCreateUserRequest(BaseModel):
+
+    users: List[CreateUserRequest] = Field(min_length=1)
+
 class DeleteUserRequest(BaseModel):
 
-    name: str
\ No newline at end of file
+    name: str
+
+class CreateBlogRequest(BaseModel):
+
+    title: str
+    body: str
@@ -0,0 +1,364 @@
+from schemas import CreateBlogRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, literal_column, table, column, func
+from sqlalchemy.orm import undefer
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from models import User, Blog
+from fastapi import HTTPException
+from typing import Optional
+from uuid import UUID
+from utils.ids import uuid7
+from database import read_session, pool_busy
+import base64
+import binascii
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 100
+
+EXPORT_BATCH_SIZE = 500
+
+EXCERPT_LENGTH = 200
+
+MAX_SEARCH_TERMS = 16
+
+blogs_fts = table('blogs_fts', column('rowid'))
+
+
+def encode_cursor(blog_id: UUID):
+
+    return base64.urlsafe_b64encode(blog_id.bytes).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str):
+
+    try:
+
+        return UUID(bytes=base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+    except (binascii.Error, ValueError):
+
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def blog_to_dict(blog: Blog):
+
+    return {'id': str(blog.id), 'title': blog.title, 'body': blog.body, 'user_id': str(blog.user_id), 'version': blog.version}
+
+
+async def create_new_blog(request: CreateBlogRequest, db: AsyncSession, current_user: User):
+
+    try:
+
+        new_blog = Blog(id=uuid7(), title=request.title, body=request.body, user_id=current_user.id, version=1)
+
+        blog = blog_to_dict(new_blog)
+
+        db.add(new_blog)
+
+        await db.commit()
+
+        return blog
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error in creating the blog {se}')
+
+        await db.rollback()
+
+        raise HTTPException(status_code=500, detail='Cannot create a blog')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown error in creating the blog {e}')
+
+        await db.rollback()
+
+        raise HTTPException(status_code=500, detail='Blog creation failed with error')
+
+
+def blogs_page_statement(user_id: UUID, limit: int, after: Optional[UUID] = None):
+
+    # Keyset pagination on (user_id, id): every page is an index range seek on ix_blogs_user_id_id, so deep pages cost the same as the first
+
+    # Column projection with a database-side excerpt: no ORM objects and no full bodies on the wire
+
+    stmt = select(Blog.id, Blog.title, Blog.user_id, func.substr(Blog.body, 1, EXCERPT_LENGTH).label('excerpt')).where(Blog.user_id == user_id)
+
+    if after is not None:
+
+        stmt = stmt.where(Blog.id > after)
+
+    # One row past the page tells whether there is a next one
+
+    return stmt.order_by(Blog.id).limit(limit + 1)
+
+
+async def get_blogs_page(user_id: UUID, db: AsyncSession, limit: int, cursor: Optional[str] = None):
+
+    try:
+
+        stmt = blogs_page_statement(user_id=user_id, limit=limit, after=decode_cursor(cursor) if cursor else None)
+
+        result = await db.execute(stmt)
+
+        rows = result.all()
+
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+
+        items = [{'id': str(row.id), 'title': row.title, 'excerpt': row.excerpt, 'user_id': str(row.user_id)} for row in rows[:limit]]
+
+        return {'items': items, 'next_cursor': next_cursor}
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error while listing blogs {se}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown error while listing blogs {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+async def stream_user_blogs(user_id: UUID):
+
+    # Owns its (replica) session so the connection is held only while the response streams and is released on disconnect
+
+    async with read_session() as db:
+
+        try:
+
+            stmt = select(Blog.id, Blog.title, Blog.body, Blog.user_id).where(Blog.user_id == user_id).order_by(Blog.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+            result = await db.stream(stmt)
+
+            async for rows in result.partitions():
+
+                yield ''.join(json.dumps({'id': str(row.id), 'title': row.title, 'body': row.body, 'user_id': str(row.user_id)}) + '\n' for row in rows)
+
+        except SQLAlchemyError as se:
+
+            logger.error(f'Error while exporting blogs {se}')
+
+            # Headers and part of the body are already sent, so a status code can no longer report the failure.
+            # A last error line marks the export as incomplete, and re-raising aborts the connection without the closing chunk
+
+            yield json.dumps({'error': 'Export failed'}) + '\n'
+
+            raise
+
+        except Exception as e:
+
+            logger.error(f'Unknown error while exporting blogs {e}')
+
+            yield json.dumps({'error': 'Export failed'}) + '\n'
+
+            raise
+
+
+def search_statement(terms: list, dialect: str):
+
+    if dialect == 'mysql':
+
+        score = match(Blog.title, Blog.body, against=' '.join(terms)).in_natural_language_mode()
+
+        return select(Blog.id, Blog.title, Blog.user_id, score.label('score')).where(score > 0).order_by(score.desc(), Blog.id)
+
+    if dialect == 'sqlite':
+
+        # Quoted terms OR-ed together, so FTS5 query syntax in user input is treated as plain words; bm25 is lower-is-better
+
+        expression = ' OR '.join(f'"{term}"' for term in terms)
+
+        score = literal_column('bm25(blogs_fts)')
+
+        return (
+            select(Blog.id, Blog.title, Blog.user_id, (-score).label('score'))
+            .select_from(blogs_fts)
+            .join(Blog.__table__, literal_column('blogs.rowid') == blogs_fts.c.rowid)
+            .where(literal_column('blogs_fts').op('MATCH')(expression))
+            .order_by(score, Blog.id)
+        )
+
+    raise HTTPException(status_code=501, detail='Search is not available on this database')
+
+
+async def search_blogs(query: str, db: AsyncSession, limit: int, page: int = 1):
+
+    try:
+
+        terms = re.findall(r'\w+', query.lower())[:MAX_SEARCH_TERMS]
+
+        if not terms:
+
+            raise HTTPException(status_code=400, detail='Search query has no searchable words')
+
+        stmt = search_statement(terms, db.get_bind().dialect.name).limit(limit + 1).offset((page - 1) * limit)
+
+        result = await db.execute(stmt)
+
+        rows = result.all()
+
+        items = [{'id': str(row.id), 'title': row.title, 'user_id': str(row.user_id), 'score': float(row.score)} for row in rows[:limit]]
+
+        return {'items': items, 'page': page, 'next_page': page + 1 if len(rows) > limit else None}
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error while searching blogs {se}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown error while searching blogs {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+async def get_blog_by_id(blog_id: UUID, db: AsyncSession, read_db: AsyncSession = None):
+
+    try:
+
+        stmt = select(Blog).options(undefer(Blog.body)).where(Blog.id == blog_id)
+
+        blog = None
+
+        if read_db is not None and read_db is not db:
+
+            result = await read_db.execute(stmt)
+
+            blog = result.scalar_one_or_none()
+
+        if not blog:
+
+            # Not on the replica yet may just mean replication lag; the primary is authoritative
+
+            result = await db.execute(stmt)
+
+            blog = result.scalar_one_or_none()
+
+        if not blog:
+
+            raise HTTPException(status_code=404, detail='Blog not found')
+
+        return blog_to_dict(blog)
+
+    except PoolTimeoutError:
+
+        # The primary fallback checks out lazily, so an exhausted pool shows up here
+
+        raise pool_busy()
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error while retriving blog {se}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown error while retriving blog {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+async def get_blog_version(blog_id: UUID, db: AsyncSession, read_db: AsyncSession = None):
+
+    try:
+
+        # Revalidation only needs the version, so neither body nor the ORM object is loaded
+
+        stmt = select(Blog.version).where(Blog.id == blog_id)
+
+        version = None
+
+        if read_db is not None and read_db is not db:
+
+            result = await read_db.execute(stmt)
+
+            version = result.scalar_one_or_none()
+
+        if version is None:
+
+            result = await db.execute(stmt)
+
+            version = result.scalar_one_or_none()
+
+        return version
+
+    except PoolTimeoutError:
+
+        raise pool_busy()
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error while retriving blog version {se}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    except Exception as e:
+
+        logger.error(f'Unknown error while retriving blog version {e}')
+
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+
+async def delete_blog(blog_id: UUID, db: AsyncSession, current_user: User):
+
+    try:
+
+        result = await db.execute(delete(Blog).where(Blog.id == blog_id, Blog.user_id == current_user.id))
+
+        if result.rowcount == 0:
+
+            await db.rollback()
+
+            raise HTTPException(status_code=404, detail='Blog not found')
+
+        await db.commit()
+
+        return True
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error in deleting the blog {se}')
+
+        await db.rollback()
+
+        raise HTTPException(status_code=500, detail='Cannot delete the blog')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown error in deleting the blog {e}')
+
+        await db.rollback()
+
+        raise HTTPException(status_code=500, detail='Blog deletion failed with error')
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import time
+
+
+class TTLCache:
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+
+        self.maxsize = maxsize
+
+        self.ttl = ttl
+
+        self.hits = 0
+
+        self.misses = 0
+
+        self._data: OrderedDict = OrderedDict()
+
+    @property
+    def enabled(self):
+
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None):
+
+        entry = self._data.get(key)
+
+        if entry is None:
+
+            self.misses += 1
+
+            return default
+
+        expires_at, value = entry
+
+        if expires_at <= time.monotonic():
+
+            self._data.pop(key, None)
+
+            self.misses += 1
+
+            return default
+
+        self._data.move_to_end(key)
+
+        self.hits += 1
+
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+
+        if not self.enabled:
+
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        if ttl <= 0:
+
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None):
+
+        entry = self._data.pop(key, None)
+
+        return default if entry is None else entry[1]
+
+    def clear(self):
+
+        self._data.clear()
+
+    def __len__(self):
+
+        return len(self._data)
+
+    def stats(self):
+
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,319 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+import gzip
+import hashlib
+import os
+import zlib
+
+try:
+
+    import brotli
+
+except ImportError:
+
+    brotli = None
+
+try:
+
+    import zstandard
+
+except ImportError:
+
+    zstandard = None
+
+load_dotenv()
+
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+
+COMPRESSION_CACHE_BYTES = int(os.getenv('COMPRESSION_CACHE_BYTES', 32 * 1024 * 1024))
+
+COMPRESSION_CACHE_MAX_ITEM = int(os.getenv('COMPRESSION_CACHE_MAX_ITEM', 1024 * 1024))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml')
+
+
+class _GzipStream:
+
+    def __init__(self):
+
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes):
+
+        # Sync flush so every streamed chunk reaches the client instead of waiting in the compressor window
+
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+
+    def __init__(self):
+
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, chunk: bytes):
+
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+
+    def __init__(self):
+
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, chunk: bytes):
+
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+
+        return self._compressor.flush()
+
+
+# encoding -> (one-shot compressor, streaming compressor), in server preference order
+
+ENCODERS = OrderedDict()
+
+if zstandard is not None:
+
+    ENCODERS['zstd'] = (lambda body: zstandard.ZstdCompressor(level=3).compress(body), _ZstdStream)
+
+if brotli is not None:
+
+    ENCODERS['br'] = (lambda body: brotli.compress(body, quality=5), _BrotliStream)
+
+ENCODERS['gzip'] = (lambda body: gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0), _GzipStream)
+
+
+def negotiate(accept_encoding: str):
+
+    accepted = {}
+
+    for part in accept_encoding.split(','):
+
+        name, _, params = part.strip().partition(';')
+
+        quality = 1.0
+
+        if params.strip().startswith('q='):
+
+            try:
+
+                quality = float(params.strip()[2:])
+
+            except ValueError:
+
+                quality = 0.0
+
+        accepted[name.strip().lower()] = quality
+
+    candidates = [(accepted.get(name, accepted.get('*', 0.0)), -index, name) for index, name in enumerate(ENCODERS)]
+
+    quality, _, name = max(candidates)
+
+    return name if quality > 0 else None
+
+
+class CompressedCache:
+
+    # LRU bounded by total compressed bytes; keys are (strong ETag or body digest, encoding)
+
+    def __init__(self, max_bytes: int, max_item: int):
+
+        self.max_bytes = max_bytes
+
+        self.max_item = max_item
+
+        self.size = 0
+
+        self.hits = 0
+
+        self.misses = 0
+
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: tuple):
+
+        value = self._data.get(key)
+
+        if value is None:
+
+            self.misses += 1
+
+            return None
+
+        self._data.move_to_end(key)
+
+        self.hits += 1
+
+        return value
+
+    def set(self, key: tuple, value: bytes):
+
+        if len(value) > self.max_item or key in self._data:
+
+            return
+
+        self._data[key] = value
+
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+
+            _, evicted = self._data.popitem(last=False)
+
+            self.size -= len(evicted)
+
+    def stats(self):
+
+        return {'items': len(self._data), 'bytes': self.size, 'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+compressed_cache = CompressedCache(max_bytes=COMPRESSION_CACHE_BYTES, max_item=COMPRESSION_CACHE_MAX_ITEM)
+
+
+class CompressionMiddleware:
+
+    def __init__(self, app):
+
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+
+        if scope['type'] != 'http':
+
+            return await self.app(scope, receive, send)
+
+        accept_encoding = next((value.decode('latin-1') for key, value in scope['headers'] if key == b'accept-encoding'), '')
+
+        encoding = negotiate(accept_encoding) if accept_encoding else None
+
+        if encoding is None:
+
+            return await self.app(scope, receive, send)
+
+        one_shot, stream_class = ENCODERS[encoding]
+
+        state = {'start': None, 'stream': None, 'passthrough': False}
+
+        async def send_compressed(message):
+
+            if message['type'] == 'http.response.start':
+
+                headers = {key.lower(): value for key, value in message.get('headers', [])}
+
+                content_type = headers.get(b'content-type', b'').decode('latin-1')
+
+                if b'content-encoding' in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+
+                    state['passthrough'] = True
+
+                    return await send(message)
+
+                state['start'] = message
+
+                return
+
+            if message['type'] != 'http.response.body' or state['passthrough']:
+
+                return await send(message)
+
+            start = state['start']
+
+            body = message.get('body', b'')
+
+            more_body = message.get('more_body', False)
+
+            if state['stream'] is None and not more_body:
+
+                # Whole body in one message: compress once, or serve cached bytes for a repeated payload
+
+                if len(body) < COMPRESSION_MIN_SIZE:
+
+                    await send(start)
+
+                    return await send(message)
+
+                etag = next((value for key, value in start['headers'] if key.lower() == b'etag' and not value.startswith(b'W/')), None)
+
+                key = (etag or hashlib.blake2b(body, digest_size=16).digest(), encoding)
+
+                compressed = compressed_cache.get(key)
+
+                if compressed is None:
+
+                    compressed = one_shot(body)
+
+                    compressed_cache.set(key, compressed)
+
+                await send(self._with_encoding(start, encoding, len(compressed)))
+
+                return await send({'type': 'http.response.body', 'body': compressed, 'more_body': False})
+
+            if state['stream'] is None:
+
+                state['stream'] = stream_class()
+
+                await send(self._with_encoding(start, encoding, None))
+
+            chunk = state['stream'].compress(body) if body else b''
+
+            if not more_body:
+
+                chunk += state['stream'].finish()
+
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _with_encoding(start: dict, encoding: str, length):
+
+        headers = []
+
+        vary = [b'Accept-Encoding']
+
+        for key, value in start.get('headers', []):
+
+            name = key.lower()
+
+            if name == b'content-length':
+
+                continue
+
+            if name == b'vary':
+
+                vary.insert(0, value)
+
+                continue
+
+            if name == b'etag' and not value.startswith(b'W/'):
+
+                # The compressed bytes differ from the identity representation, so the validator becomes weak
+
+                value = b'W/' + value
+
+            headers.append((key, value))
+
+        headers.append((b'content-encoding', encoding.encode()))
+
+        headers.append((b'vary', b', '.join(vary)))
+
+        if length is not None:
+
+            headers.append((b'content-length', str(length).encode()))
+
+        return {**start, 'headers': headers}
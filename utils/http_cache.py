@@ -0,0 +1,43 @@
+from dotenv import load_dotenv
+from uuid import UUID
+import os
+
+load_dotenv()
+
+# Blog responses are per user, so shared caches must not store them; no-cache makes clients revalidate with the ETag
+
+CACHE_CONTROL_POLICIES = {
+    'blog_detail': os.getenv('CACHE_CONTROL_BLOG_DETAIL', 'private, no-cache'),
+    'blog_list': os.getenv('CACHE_CONTROL_BLOG_LIST', 'private, no-store'),
+    'blog_search': os.getenv('CACHE_CONTROL_BLOG_SEARCH', 'private, no-store'),
+}
+
+
+def cache_control(route: str):
+
+    return CACHE_CONTROL_POLICIES.get(route, 'no-store')
+
+
+def blog_etag(blog_id: UUID, version: int):
+
+    return f'"{blog_id.hex}-{version}"'
+
+
+def matching_etag(if_none_match: str, etag: str):
+
+    # If-None-Match uses the weak comparison, so W/ prefixes (e.g. added by the compression middleware) are ignored.
+    # Returns the validator for the 304 in the form the client holds it: weak if its cached 200 was compressed
+
+    if if_none_match.strip() == '*':
+
+        return etag
+
+    for candidate in if_none_match.split(','):
+
+        candidate = candidate.strip()
+
+        if candidate.removeprefix('W/') == etag:
+
+            return candidate
+
+    return None
@@ -0,0 +1,89 @@
+from sqlalchemy import UUID, BINARY
+from sqlalchemy.types import TypeDecorator
+from dotenv import load_dotenv
+from uuid import UUID as PyUUID
+import os
+import threading
+import time
+
+load_dotenv()
+
+# 'native' keeps SQLAlchemy's UUID type; 'binary' stores every UUID column as BINARY(16). Pick it before the first migration
+
+UUID_STORAGE = os.getenv('UUID_STORAGE', 'native')
+
+_lock = threading.Lock()
+
+_last_ms = 0
+
+_counter = 0
+
+
+def uuid7():
+
+    # RFC 9562 UUIDv7: 48-bit Unix ms timestamp, then a 12-bit counter (randomly seeded each ms) in rand_a and 62 random bits.
+    # Values from one process only ever increase, so primary-key inserts append to the right edge of the B-tree.
+
+    global _last_ms, _counter
+
+    with _lock:
+
+        now_ms = time.time_ns() // 1_000_000
+
+        if now_ms > _last_ms:
+
+            _last_ms = now_ms
+
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+
+        else:
+
+            # Same millisecond or the clock stepped back: keep the last timestamp and count up, borrowing the next ms on overflow
+
+            _counter += 1
+
+            if _counter > 0xFFF:
+
+                _last_ms += 1
+
+                _counter = 0
+
+        timestamp, counter = _last_ms, _counter
+
+    random_bits = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+
+    return PyUUID(int=(timestamp << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits)
+
+
+class BinaryUUID(TypeDecorator):
+
+    # 16 raw bytes instead of CHAR(32); the byte order is the UUID's, so UUIDv7 keys stay time ordered
+
+    impl = BINARY(16)
+
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+
+        if value is None:
+
+            return None
+
+        return (value if isinstance(value, PyUUID) else PyUUID(str(value))).bytes
+
+    def literal_processor(self, dialect):
+
+        def process(value):
+
+            return 'NULL' if value is None else f"X'{(value if isinstance(value, PyUUID) else PyUUID(str(value))).hex}'"
+
+        return process
+
+    def process_result_value(self, value, dialect):
+
+        return None if value is None else PyUUID(bytes=bytes(value))
+
+
+def UUIDType():
+
+    return BinaryUUID() if UUID_STORAGE == 'binary' else UUID(as_uuid=True)
@@ -0,0 +1,405 @@
+from bisect import bisect_left
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# With several workers each process writes its snapshot here and /internal/metrics sums them; empty means this process only
+
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR', '')
+
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+JWT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005)
+
+# Every observation is made on the event loop thread (bcrypt is timed around the awaited pool future), so the plain
+# dict updates below need no lock
+
+REGISTRY = []
+
+_collectors = []
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+
+        self.name = name
+
+        self.help = help
+
+        self.labels = labels
+
+        self.values = {}
+
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+
+        if METRICS_ENABLED:
+
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+
+class Gauge(Counter):
+
+    kind = 'gauge'
+
+    def set(self, value: float, *labels):
+
+        self.values[labels] = value
+
+
+class _Timer:
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels: tuple):
+
+        self.histogram = histogram
+
+        self.labels = labels
+
+    def __enter__(self):
+
+        self.started = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+
+        self.name = name
+
+        self.help = help
+
+        self.labels = labels
+
+        self.buckets = buckets
+
+        # labels -> [count per bucket..., count above the last bucket, sum]
+
+        self.values = {}
+
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+
+        if not METRICS_ENABLED:
+
+            return
+
+        entry = self.values.get(labels)
+
+        if entry is None:
+
+            entry = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        entry[bisect_left(self.buckets, value)] += 1
+
+        entry[-1] += value
+
+    def time(self, *labels):
+
+        return _Timer(self, labels)
+
+
+HTTP_REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency by route template', ('method', 'route', 'status'))
+
+DB_QUERY_SECONDS = Histogram('db_query_duration_seconds', 'Database statement latency by statement type', ('statement',))
+
+DB_POOL_CHECKOUT_WAIT_SECONDS = Histogram('db_pool_checkout_wait_seconds', 'Time a request waited for a pooled connection')
+
+DB_POOL_TIMEOUTS = Counter('db_pool_timeouts_total', 'Connection checkouts that timed out')
+
+DB_POOL_CONNECTIONS = Gauge('db_pool_connections', 'Primary pool connections by state', ('state',))
+
+BCRYPT_SECONDS = Histogram('bcrypt_duration_seconds', 'bcrypt hash/verify latency including the wait for a pool thread', ('operation',), buckets=BCRYPT_BUCKETS)
+
+JWT_SECONDS = Histogram('jwt_duration_seconds', 'JWT encode/decode latency (cache hits are not counted)', ('operation', 'token'), buckets=JWT_BUCKETS)
+
+AUTH_TOKEN_OUTCOMES = Counter('auth_token_outcomes_total', 'Which token authenticated a request, or rejected when neither did', ('outcome',))
+
+
+def register_collector(collector):
+
+    # Called before every snapshot to refresh values that are read rather than recorded, such as gauges
+
+    _collectors.append(collector)
+
+
+def snapshot(gauges: bool = True):
+
+    for collector in _collectors:
+
+        try:
+
+            collector()
+
+        except Exception as e:
+
+            logger.error(f'Metrics collector failed {e}')
+
+    return {metric.name: [[list(labels), value] for labels, value in metric.values.items()] for metric in REGISTRY if gauges or metric.kind != 'gauge'}
+
+
+def _merge(total: dict, other: dict, gauges: bool = True):
+
+    kinds = {metric.name: metric.kind for metric in REGISTRY}
+
+    for name, samples in other.items():
+
+        if not gauges and kinds.get(name) == 'gauge':
+
+            continue
+
+        merged = total.setdefault(name, {})
+
+        for labels, value in samples:
+
+            key = tuple(labels)
+
+            current = merged.get(key)
+
+            if current is None:
+
+                merged[key] = list(value) if isinstance(value, list) else value
+
+            elif isinstance(value, list):
+
+                merged[key] = [a + b for a, b in zip(current, value)]
+
+            else:
+
+                merged[key] = current + value
+
+
+def _snapshot_path(pid: int):
+
+    return os.path.join(METRICS_MULTIPROCESS_DIR, f'metrics-{pid}.json')
+
+
+def write_snapshot(gauges: bool = True):
+
+    path = _snapshot_path(os.getpid())
+
+    with open(path + '.tmp', 'w') as output:
+
+        json.dump(snapshot(gauges=gauges), output)
+
+    os.replace(path + '.tmp', path)
+
+
+def _pid_alive(pid: int):
+
+    try:
+
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+
+        return False
+
+    except PermissionError:
+
+        return True
+
+    return True
+
+
+def _escape(value):
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names: tuple, values: tuple, extra: str = ''):
+
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+
+        pairs.append(extra)
+
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render():
+
+    merged = {}
+
+    _merge(merged, snapshot())
+
+    if METRICS_MULTIPROCESS_DIR:
+
+        # Other workers' last snapshots; this process contributes its live values instead of its file.
+        # Counters and histograms of exited workers stay in the sums so totals never go backwards; their gauges
+        # (pool connections they no longer hold) are left out
+
+        own = os.path.basename(_snapshot_path(os.getpid()))
+
+        for filename in os.listdir(METRICS_MULTIPROCESS_DIR):
+
+            if filename.startswith('metrics-') and filename.endswith('.json') and filename != own:
+
+                try:
+
+                    with open(os.path.join(METRICS_MULTIPROCESS_DIR, filename)) as source:
+
+                        pid = filename[len('metrics-'):-len('.json')]
+
+                        _merge(merged, json.load(source), gauges=pid.isdigit() and _pid_alive(int(pid)))
+
+                except (OSError, ValueError) as e:
+
+                    logger.error(f'Skipping unreadable metrics snapshot {filename} {e}')
+
+    lines = []
+
+    for metric in REGISTRY:
+
+        lines.append(f'# HELP {metric.name} {metric.help}')
+
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+
+        for labels, value in sorted(merged.get(metric.name, {}).items()):
+
+            if metric.kind != 'histogram':
+
+                lines.append(f'{metric.name}{_label_text(metric.labels, labels)} {value}')
+
+                continue
+
+            cumulative = 0
+
+            for bound, count in zip((*metric.buckets, '+Inf'), value):
+
+                cumulative += count
+
+                le = 'le="%s"' % bound
+
+                lines.append(f'{metric.name}_bucket{_label_text(metric.labels, labels, le)} {cumulative}')
+
+            lines.append(f'{metric.name}_sum{_label_text(metric.labels, labels)} {value[-1]}')
+
+            lines.append(f'{metric.name}_count{_label_text(metric.labels, labels)} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter:
+
+    # Periodically publishes this worker's snapshot for the others to merge; a no-op without METRICS_MULTIPROCESS_DIR
+
+    def __init__(self, interval: float):
+
+        self.interval = interval
+
+        self._task = None
+
+    async def _run(self):
+
+        while True:
+
+            await asyncio.sleep(self.interval)
+
+            try:
+
+                write_snapshot()
+
+            except OSError as e:
+
+                logger.error(f'Could not write the metrics snapshot {e}')
+
+    def start(self):
+
+        if METRICS_ENABLED and METRICS_MULTIPROCESS_DIR and self._task is None:
+
+            # An exited worker may have had this pid; keep its counts under a name no live process writes to
+
+            path = _snapshot_path(os.getpid())
+
+            if os.path.exists(path):
+
+                os.replace(path, os.path.join(METRICS_MULTIPROCESS_DIR, f'metrics-retired-{os.getpid()}-{time.time_ns()}.json'))
+
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+
+        # Last write keeps this worker's counts in the totals after it exits, without its gauges
+
+        if self._task is not None:
+
+            self._task.cancel()
+
+            self._task = None
+
+            try:
+
+                write_snapshot(gauges=False)
+
+            except OSError as e:
+
+                logger.error(f'Could not write the metrics snapshot {e}')
+
+
+metrics_exporter = MetricsExporter(interval=METRICS_FLUSH_SECONDS)
+
+
+class MetricsMiddleware:
+
+    def __init__(self, app):
+
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+
+        if scope['type'] != 'http':
+
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+
+        status = {'code': 500}
+
+        async def send_with_status(message):
+
+            if message['type'] == 'http.response.start':
+
+                status['code'] = message['status']
+
+            await send(message)
+
+        try:
+
+            await self.app(scope, receive, send_with_status)
+
+        finally:
+
+            # The route template, not the raw path, so ids in URLs do not create a series each
+
+            route = scope.get('route')
+
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope['method'], getattr(route, 'path', 'unmatched'), str(status['code']))
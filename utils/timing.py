@@ -0,0 +1,92 @@
+from contextvars import ContextVar
+from contextlib import nullcontext
+from typing import Optional
+from dotenv import load_dotenv
+import time
+import os
+
+load_dotenv()
+
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# Per-request stage durations in milliseconds; None outside a timed request so disabled hooks cost one ContextVar lookup
+
+_timings: ContextVar[Optional[dict]] = ContextVar('server_timing', default=None)
+
+
+class _Stage:
+
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name: str):
+
+        self.name = name
+
+        self.started = None
+
+    def __enter__(self):
+
+        if _timings.get() is not None:
+
+            self.started = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        if self.started is not None:
+
+            timings = _timings.get()
+
+            timings[self.name] = timings.get(self.name, 0.0) + (time.perf_counter() - self.started) * 1000
+
+
+_disabled = nullcontext()
+
+
+def timed(name: str):
+
+    if not SERVER_TIMING_ENABLED:
+
+        return _disabled
+
+    return _Stage(name)
+
+
+class ServerTimingMiddleware:
+
+    def __init__(self, app):
+
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+
+        if scope['type'] != 'http':
+
+            return await self.app(scope, receive, send)
+
+        timings = {}
+
+        token = _timings.set(timings)
+
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+
+            if message['type'] == 'http.response.start':
+
+                timings['total'] = (time.perf_counter() - started) * 1000
+
+                header = ', '.join(f'{name};dur={duration:.3f}' for name, duration in timings.items())
+
+                message['headers'] = list(message.get('headers', [])) + [(b'server-timing', header.encode())]
+
+            await send(message)
+
+        try:
+
+            await self.app(scope, receive, send_with_timing)
+
+        finally:
+
+            _timings.reset(token)
@@ -1,29 +1,74 @@
 from schemas import LoginUserRequest, CreateUserRequest
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from models import User
-from fastapi import HTTPException, Response
-from auth.security import verify_password, get_hash
+from sqlalchemy import select, insert, update, delete
+from models import User, Blog
+from fastapi import HTTPException, Response, BackgroundTasks
+from auth.security import verify_password, get_hash, get_hashes
 from auth.token import create_access_token, create_refresh_token
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from typing import List
+from dotenv import load_dotenv
+import asyncio
 import logging
+import os
 from uuid import uuid4
-from auth.dependencies import clear_cookie
+from utils.ids import uuid7
+from auth.dependencies import clear_cookie, invalidate_user_cache, revoke_session
 from utils.time_setting import get_current_ist_time
+from utils.timing import timed
+from database import pin_to_primary, async_session
 
 
 logger = logging.getLogger(__name__)
 
+load_dotenv()
 
-async def user_login(request: LoginUserRequest, db: AsyncSession):
+BULK_CREATE_MAX_USERS = int(os.getenv('BULK_CREATE_MAX_USERS', 1000))
+
+# Accounts with more blogs than this are purged in the background in batches; 0 always deletes in the request
+
+USER_PURGE_THRESHOLD = int(os.getenv('USER_PURGE_THRESHOLD', 0))
+
+USER_PURGE_BATCH_SIZE = int(os.getenv('USER_PURGE_BATCH_SIZE', 1000))
+
+USER_PURGE_RETRIES = int(os.getenv('USER_PURGE_RETRIES', 5))
+
+# What login needs from the users row; looked up through the unique index on name
+
+USER_LOGIN_COLUMNS = (User.id, User.name, User.password, User.session_id)
+
+
+async def user_login(request: LoginUserRequest, db: AsyncSession, read_db: AsyncSession = None):
 
     try:
 
-        stmt = select(User).where(User.name == request.name)
+        stmt = select(*USER_LOGIN_COLUMNS).where(User.name == request.name)
+
+        user = None
+
+        if read_db is not None and read_db is not db:
+
+            try:
 
-        result = await db.execute(stmt)
+                with timed('db'):
 
-        user = result.scalar_one_or_none()
+                    result = await read_db.execute(stmt)
+
+                user = result.one_or_none()
+
+            except SQLAlchemyError as se:
+
+                logger.warning(f'Replica read failed, using the primary {se}')
+
+        if not user:
+
+            # Also covers users created moments ago that have not reached the replica yet
+
+            with timed('db'):
+
+                result = await db.execute(stmt)
+
+            user = result.one_or_none()
 
         if not user:
 
@@ -35,15 +80,49 @@ async def user_login(request: LoginUserRequest, db: AsyncSession):
 
             raise HTTPException(status_code=401, detail='Username or Password is incorrect')
 
-        user.session_id = uuid4()
+        revoked_session_id = user.session_id
 
-        db.add(user)
+        session_id = uuid4()
 
-        await db.commit()
+        # Only replaces the session that was read, so the one revoked below is the one the primary actually held
 
-        await db.refresh(user)
+        with timed('db'):
 
-        data = {"id": str(user.id), 'name': user.name, 'session_id': str(user.session_id)}
+            result = await db.execute(update(User).where(User.id == user.id, User.session_id == revoked_session_id).values(session_id=session_id))
+
+        if result.rowcount == 0:
+
+            # Read from a lagging replica or raced by another login; take the current session from the primary under a row lock
+
+            with timed('db'):
+
+                result = await db.execute(select(User.session_id).where(User.id == user.id).with_for_update())
+
+            revoked_session_id = result.scalar_one_or_none()
+
+            if revoked_session_id is None:
+
+                # Deleted on the primary after the lookup
+
+                await db.rollback()
+
+                raise HTTPException(status_code=404, detail='User not found')
+
+            with timed('db'):
+
+                await db.execute(update(User).where(User.id == user.id).values(session_id=session_id))
+
+        with timed('commit'):
+
+            await db.commit()
+
+        pin_to_primary(user.id)
+
+        invalidate_user_cache(user.id)
+
+        revoke_session(revoked_session_id)
+
+        data = {"id": str(user.id), 'name': user.name, 'session_id': str(session_id)}
 
         access_token = await create_access_token(data=data)
 
@@ -75,13 +154,21 @@ async def user_logout(current_user: User, response: Response, db: AsyncSession):
 
             return await clear_cookie(response=response)
 
+        revoked_session_id = current_user.session_id
+
         current_user.session_id = uuid4()
 
         db.add(current_user)
 
-        await db.commit()
+        with timed('commit'):
+
+            await db.commit()
 
-        await db.refresh(current_user)
+        pin_to_primary(current_user.id)
+
+        invalidate_user_cache(current_user.id)
+
+        revoke_session(revoked_session_id)
 
         return True
 
@@ -105,13 +192,13 @@ async def create_new_user(request: CreateUserRequest, db: AsyncSession, current_
 
         hashed_pwd = await get_hash(plain_password=request.password)
 
-        new_user = User(id=uuid4(), name=request.name, session_id=uuid4(), created_at=created_time, password=hashed_pwd, created_by=current_user.id)
+        new_user = User(id=uuid7(), name=request.name, session_id=uuid4(), created_at=created_time, password=hashed_pwd, created_by=current_user.id)
 
         db.add(new_user)
 
-        await db.commit()
+        with timed('commit'):
 
-        await db.refresh(new_user)
+            await db.commit()
 
         return new_user
 
@@ -131,14 +218,229 @@ async def create_new_user(request: CreateUserRequest, db: AsyncSession, current_
 
         raise HTTPException(status_code=500, detail='User creating failed with error')
 
-async def delete_current_user(current_user: User, db: AsyncSession):
+async def _existing_names(names: list, db: AsyncSession):
+
+    with timed('db'):
+
+        result = await db.execute(select(User.name).where(User.name.in_(names)))
+
+    return set(result.scalars())
+
+async def create_new_users_bulk(requests: List[CreateUserRequest], db: AsyncSession, current_user: User):
 
     try:
 
-        await db.delete(current_user)
+        if len(requests) > BULK_CREATE_MAX_USERS:
+
+            raise HTTPException(status_code=413, detail=f'At most {BULK_CREATE_MAX_USERS} users per batch')
+
+        results = [{'name': request.name} for request in requests]
+
+        existing = await _existing_names(names=list({request.name for request in requests}), db=db)
+
+        seen = set()
+
+        pending = []
+
+        for index, request in enumerate(requests):
+
+            if request.name in existing or request.name in seen:
+
+                results[index].update({'status': 'conflict', 'detail': 'User name already exists'})
+
+                continue
+
+            seen.add(request.name)
+
+            pending.append(index)
+
+        # Hash only the rows that can be inserted; the pool spreads the bcrypt work across cores
+
+        hashes = await get_hashes([requests[index].password for index in pending])
+
+        created_time = await get_current_ist_time()
+
+        rows = {}
+
+        for index, hashed_pwd in zip(pending, hashes):
+
+            if isinstance(hashed_pwd, HTTPException):
+
+                results[index].update({'status': 'error', 'detail': hashed_pwd.detail})
+
+                continue
+
+            rows[index] = {'id': uuid7(), 'name': requests[index].name, 'password': hashed_pwd, 'session_id': uuid4(), 'created_at': created_time, 'created_by': current_user.id}
+
+        for attempt in range(2):
+
+            if not rows:
+
+                break
+
+            try:
+
+                with timed('db'):
+
+                    await db.execute(insert(User), list(rows.values()))
+
+                with timed('commit'):
+
+                    await db.commit()
+
+                break
+
+            except IntegrityError as ie:
+
+                await db.rollback()
+
+                if attempt:
+
+                    raise ie
+
+                # A concurrent request claimed some names between the check and the insert; drop those and retry once
+
+                taken = await _existing_names(names=[row['name'] for row in rows.values()], db=db)
+
+                for index in [index for index, row in rows.items() if row['name'] in taken]:
+
+                    results[index].update({'status': 'conflict', 'detail': 'User name already exists'})
+
+                    del rows[index]
+
+        for index, row in rows.items():
+
+            results[index].update({'status': 'created', 'id': str(row['id'])})
+
+        return results
+
+    except SQLAlchemyError as se:
+
+        logger.error(f'Error in bulk creating users {se}')
+
+        await db.rollback()
+
+        raise HTTPException(status_code=500, detail='Cannot create users')
+
+    except HTTPException as he:
+
+        raise he
+
+    except Exception as e:
+
+        logger.error(f'Unknown error in bulk creating users {e}')
+
+        await db.rollback()
+
+        raise HTTPException(status_code=500, detail='User creating failed with error')
+
+async def _has_more_blogs_than(user_id, threshold: int, db: AsyncSession):
+
+    # Probes one row past the threshold on ix_blogs_user_id_id instead of counting every blog
+
+    result = await db.execute(select(Blog.id).where(Blog.user_id == user_id).offset(threshold).limit(1))
+
+    return result.first() is not None
+
+
+async def _purge_user_once(user_id):
+
+    # Short batched transactions so a huge account never holds locks or a long undo log; the user row goes last
+
+    async with async_session() as db:
+
+        while True:
+
+            ids = (await db.execute(select(Blog.id).where(Blog.user_id == user_id).limit(USER_PURGE_BATCH_SIZE))).scalars().all()
+
+            if not ids:
+
+                break
+
+            await db.execute(delete(Blog).where(Blog.id.in_(ids)))
+
+            await db.commit()
+
+        await db.execute(delete(User).where(User.id == user_id))
 
         await db.commit()
 
+
+async def purge_user(user_id):
+
+    # The account is already locked; every batch is idempotent, so a failed attempt is retried from where it stopped
+
+    for attempt in range(USER_PURGE_RETRIES + 1):
+
+        try:
+
+            await _purge_user_once(user_id)
+
+            return
+
+        except SQLAlchemyError as se:
+
+            logger.error(f'Error while purging user {user_id}, attempt {attempt + 1} {se}')
+
+        except Exception as e:
+
+            logger.error(f'Unknown error while purging user {user_id}, attempt {attempt + 1} {e}')
+
+        if attempt < USER_PURGE_RETRIES:
+
+            await asyncio.sleep(min(2 ** attempt, 60))
+
+    logger.error(f'Gave up purging user {user_id}; the account stays locked and its remaining blogs and row must be deleted by hand')
+
+
+async def delete_current_user(current_user: User, db: AsyncSession, background_tasks: BackgroundTasks = None):
+
+    try:
+
+        user_id = current_user.id
+
+        session_id = current_user.session_id
+
+        if USER_PURGE_THRESHOLD and background_tasks is not None and await _has_more_blogs_than(user_id, USER_PURGE_THRESHOLD, db):
+
+            # Lock the account now: a new session id revokes every token and a hash of a random secret makes login impossible
+
+            locked_password = await get_hash(uuid4().hex)
+
+            with timed('db'):
+
+                await db.execute(update(User).where(User.id == user_id).values(session_id=uuid4(), password=locked_password))
+
+            with timed('commit'):
+
+                await db.commit()
+
+            background_tasks.add_task(purge_user, user_id)
+
+        else:
+
+            # One statement whatever the account size; the database cascades to the blogs
+
+            with timed('db'):
+
+                result = await db.execute(delete(User).where(User.id == user_id))
+
+            if result.rowcount == 0:
+
+                await db.rollback()
+
+                raise HTTPException(status_code=404, detail='User not found')
+
+            with timed('commit'):
+
+                await db.commit()
+
+        pin_to_primary(user_id)
+
+        invalidate_user_cache(user_id)
+
+        revoke_session(session_id)
+
         return True
 
     except SQLAlchemyError as se:
@@ -0,0 +1,186 @@
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers
+from dotenv import load_dotenv
+from uuid import uuid4
+from database import async_engine, replica_engines, async_session, replica_sessions, DB_POOL_SIZE
+from models import User, Blog
+from auth.dependencies import USER_SNAPSHOT_COLUMNS
+from auth.security import warm_up_pool
+from auth.token import warm_up_codecs
+from utils.user_utils import USER_LOGIN_COLUMNS
+from utils.blog_utils import blogs_page_statement
+import asyncio
+import logging
+import os
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+WARMUP_DB_CONNECTIONS = int(os.getenv('WARMUP_DB_CONNECTIONS', min(DB_POOL_SIZE, 5)))
+
+WARMUP_RETRY_SECONDS = float(os.getenv('WARMUP_RETRY_SECONDS', 5))
+
+# Seconds between SIGTERM and the start of uvicorn's shutdown, during which /internal/ready answers 503 while requests are still served
+
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', 5))
+
+_state = {'ready': False, 'draining': False}
+
+
+def hot_statements():
+
+    # The statements behind authentication, login and blog reads, with throwaway parameters
+
+    return {
+        'get_user_by_id': select(*USER_SNAPSHOT_COLUMNS).where(User.id == uuid4()),
+        'login_by_name': select(*USER_LOGIN_COLUMNS).where(User.name == 'someone'),
+        'blogs_page': blogs_page_statement(user_id=uuid4(), limit=20, after=uuid4()),
+        'blog_version': select(Blog.version).where(Blog.id == uuid4()),
+    }
+
+
+async def _open_connections(engine, count: int):
+
+    # Held at the same time so the pool really opens count connections, then all returned to it
+
+    async def open_one():
+
+        connection = await engine.connect()
+
+        await connection.exec_driver_sql('SELECT 1')
+
+        return connection
+
+    results = await asyncio.gather(*(open_one() for _ in range(count)), return_exceptions=True)
+
+    for result in results:
+
+        if not isinstance(result, BaseException):
+
+            await result.close()
+
+    for result in results:
+
+        if isinstance(result, BaseException):
+
+            raise result
+
+
+async def _compile_statements(session_factory):
+
+    # Executing through a session fills the engine's compiled cache for the ORM path the requests take
+
+    async with session_factory() as db:
+
+        for statement in hot_statements().values():
+
+            await db.execute(statement)
+
+
+async def _warm_up_process():
+
+    # Not fatal: requests still work, they only pay these costs themselves
+
+    try:
+
+        configure_mappers()
+
+        warm_up_codecs()
+
+        await warm_up_pool()
+
+    except Exception as e:
+
+        logger.error(f'Warm-up of mappers and crypto backends failed, continuing without it {e}')
+
+
+async def _warm_up_database():
+
+    while True:
+
+        try:
+
+            for engine in (async_engine, *replica_engines):
+
+                await _open_connections(engine, WARMUP_DB_CONNECTIONS)
+
+            for session_factory in (async_session, *replica_sessions):
+
+                await _compile_statements(session_factory)
+
+            break
+
+        except Exception as e:
+
+            logger.error(f'Warm-up could not reach the database, retrying in {WARMUP_RETRY_SECONDS}s {e}')
+
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+
+async def warm_up():
+
+    # Anything escaping here would end the task silently and leave readiness at 503 with nothing logged
+
+    try:
+
+        await _warm_up_process()
+
+        await _warm_up_database()
+
+    except Exception as e:
+
+        logger.error(f'Warm-up failed, readiness stays at 503 {e}')
+
+        return
+
+    _state['ready'] = True
+
+    logger.info('Warm-up finished, reporting ready')
+
+
+def is_ready():
+
+    return _state['ready'] and not _state['draining']
+
+
+def is_draining():
+
+    return _state['draining']
+
+
+def mark_not_ready():
+
+    _state['draining'] = True
+
+
+def install_drain_handler():
+
+    # Runs inside the lifespan, after uvicorn installed its own handlers, which only run once the delay has passed.
+    # A second SIGTERM, or SIGINT, shuts down at once
+
+    if SHUTDOWN_DRAIN_SECONDS <= 0 or threading.current_thread() is not threading.main_thread():
+
+        return
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    if not callable(previous):
+
+        return
+
+    loop = asyncio.get_running_loop()
+
+    def handle_sigterm(signum, frame):
+
+        if _state['draining']:
+
+            return previous(signum, frame)
+
+        mark_not_ready()
+
+        loop.call_soon_threadsafe(loop.call_later, SHUTDOWN_DRAIN_SECONDS, previous, signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)